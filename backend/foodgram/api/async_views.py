@@ -0,0 +1,129 @@
+import asyncio
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .conditional import (check_conditional, recipe_list_validators,
+                          recipe_validators, set_validators)
+from .views import IngredientsViewSet, RecipeViewSet, TagViewSet, UsersViewSet
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}
+
+semaphores = weakref.WeakKeyDictionary()
+
+
+def get_semaphore():
+    """ Не больше ASYNC_DB_CONCURRENCY обращений к базе на цикл событий """
+    loop = asyncio.get_running_loop()
+    if loop not in semaphores:
+        semaphores[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+    return semaphores[loop]
+
+
+def call_in_thread(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def db(func, *args, **kwargs):
+    """ Синхронный код с ORM в пуле потоков, у каждого своё соединение """
+    async with get_semaphore():
+        return await sync_to_async(
+            call_in_thread, thread_sensitive=False
+        )(func, *args, **kwargs)
+
+
+def make_view(viewset, actions, request, **kwargs):
+    """ Экземпляр вьюсета, подготовленный так же, как в as_view() """
+    view = viewset(action_map=dict(actions, head=actions['get']))
+    view.args, view.kwargs, view.format_kwarg = (), kwargs, None
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    return view
+
+
+def start(view, validators, **kwargs):
+    """ Аутентификация, права, троттлинг и условный GET """
+    view.initial(view.request, **kwargs)
+    return check_conditional(validators, view, view.request, **kwargs)
+
+
+def finish(view, response, etag=None, timestamp=None):
+    response = view.finalize_response(
+        view.request, set_validators(response, etag, timestamp)
+    )
+    return response.render() if hasattr(response, 'render') else response
+
+
+def handle_error(view, exc):
+    return finish(view, view.handle_exception(exc))
+
+
+def call_method(view, method, kwargs):
+    """ Метод вьюсета без обёртки условного GET: он уже проверен """
+    return method.__wrapped__(view, view.request, **kwargs)
+
+
+def async_read_view(viewset, actions, validators):
+    """ GET и HEAD — тем же методом вьюсета по шагам в пуле потоков.
+
+    Запрос рецептов, фильтры, пагинация и сериализатор — те же, что у
+    синхронного вьюсета; остальные методы — обычный DRF.
+    """
+    sync_view = viewset.as_view(actions)
+    method = getattr(viewset, actions['get'])
+
+    async def view(request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(sync_view)(request, **kwargs)
+        drf_view = make_view(viewset, actions, request, **kwargs)
+        try:
+            etag, timestamp, response = await db(
+                start, drf_view, validators, **kwargs
+            )
+            if response is None:
+                response = await db(call_method, drf_view, method, kwargs)
+            return await db(finish, drf_view, response, etag, timestamp)
+        except Exception as exc:
+            return await db(handle_error, drf_view, exc)
+
+    view.csrf_exempt = True
+    return view
+
+
+def bounded_view(viewset, actions, **initkwargs):
+    """ Обычный DRF-вью в общем пуле потоков с ограничением на базу """
+    sync_view = viewset.as_view(actions, **initkwargs)
+
+    def call(request, kwargs):
+        response = sync_view(request, **kwargs)
+        return response.render() if hasattr(response, 'render') else response
+
+    async def view(request, **kwargs):
+        return await db(call, request, kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+recipe_list = async_read_view(
+    RecipeViewSet, LIST_ACTIONS, recipe_list_validators
+)
+recipe_detail = async_read_view(
+    RecipeViewSet, DETAIL_ACTIONS, recipe_validators
+)
+tag_list = bounded_view(TagViewSet, {'get': 'list'})
+ingredient_list = bounded_view(IngredientsViewSet, {'get': 'list'})
+subscriptions = bounded_view(
+    UsersViewSet, {'get': 'subscriptions'}, basename='users', detail=False
+)
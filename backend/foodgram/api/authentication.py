@@ -0,0 +1,127 @@
+import os
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import bump_version, get_versions
+
+
+def get_tokens_key(user_id):
+    """ Версия токенов пользователя: меняется при их отзыве """
+    return f'auth:user:{user_id}:version'
+
+
+class TokenCache:
+    """ Токен → (пользователь, токен) без запроса к базе.
+
+    Записи лежат в общем кэше и в LRU процесса вместе с id пользователя
+    и версией его токенов на момент загрузки. Отзыв (выход, смена
+    пароля, изменение или отключение пользователя) меняет версию только
+    этого пользователя, и все процессы перестают доверять его записям
+    уже на следующем запросе. Хэш пароля в кэш не попадает: поле
+    отложено и читается из базы при обращении.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.stats = Counter()
+
+    def get_shared_key(self, key):
+        return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+    def get_local(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set_local(self, key, entry):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL, entry
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def is_current(self, entry):
+        user_id, version, _ = entry
+        return get_versions(get_tokens_key(user_id))[0] == version
+
+    def get(self, key, load):
+        """ Из памяти процесса, из общего кэша или load() из базы """
+        entry = self.get_local(key)
+        if entry is not None and self.is_current(entry):
+            self.stats['local_hits'] += 1
+            return pickle.loads(entry[2])
+        shared_key = self.get_shared_key(key)
+        entry = cache.get(shared_key)
+        if entry is not None and self.is_current(entry):
+            self.stats['shared_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            user, token = load()
+            entry = (
+                user.id,
+                get_versions(get_tokens_key(user.id))[0],
+                pickle.dumps((user, token)),
+            )
+            cache.set(shared_key, entry, settings.AUTH_TOKEN_CACHE_TTL)
+        self.set_local(key, entry)
+        return pickle.loads(entry[2])
+
+    def revoke(self, user_id):
+        self.stats['revocations'] += 1
+        bump_version(get_tokens_key(user_id))
+
+    def get_stats(self):
+        return {
+            'pid': os.getpid(),
+            'size': len(self.entries),
+            **{name: self.stats[name] for name in (
+                'local_hits', 'shared_hits', 'misses', 'revocations'
+            )},
+        }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ TokenAuthentication с кэшем проверенных токенов.
+
+    Кэш включается только с общим для процессов кэшем (memcached);
+    иначе токен и пользователь проверяются в базе на каждом запросе.
+    """
+
+    def load_credentials(self, key):
+        """ Как у TokenAuthentication, но без хэша пароля """
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').defer(
+                'user__password'
+            ).get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token.user, token
+
+    def authenticate_credentials(self, key):
+        if not settings.CACHE_IS_SHARED:
+            # Отзыв токена не дошёл бы до других процессов
+            return self.load_credentials(key)
+        return token_cache.get(key, lambda: self.load_credentials(key))
@@ -0,0 +1,78 @@
+import threading
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.core.cache import cache
+
+
+def new_version():
+    """ Версия — время изменения и случайная часть """
+    return f'{time.time():.6f}:{uuid4().hex[:16]}'
+
+
+def get_version_time(version):
+    """ Время изменения из версии, для Last-Modified """
+    return datetime.fromtimestamp(
+        float(version.split(':')[0]), tz=timezone.utc
+    )
+
+
+def get_versions(*keys):
+    """ Текущие версии по ключам общего кэша, недостающие создаются """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(key):
+    cache.set(key, new_version(), timeout=None)
+
+
+def get_viewer_key(user_id):
+    """ Версия избранного, корзины и подписок пользователя """
+    return f'viewer:{user_id}:version'
+
+
+def get_user_key(user_id):
+    """ Версия видных в ответах полей пользователя """
+    return f'user:{user_id}:version'
+
+
+class CatalogCache:
+    """ Справочники в памяти процесса с общей версией в кэше.
+
+    Версия меняется при изменении тегов и ингредиентов, после чего каждый
+    процесс заново берёт данные из общего кэша или собирает их из базы.
+    """
+    version_key = 'catalog:version'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get_version(self):
+        return get_versions(self.version_key)[0]
+
+    def bump(self):
+        bump_version(self.version_key)
+
+    def get(self, name, build):
+        version = self.get_version()
+        entry = self.entries.get(name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self.lock:
+            key = f'catalog:{name}:{version}'
+            value = cache.get(key)
+            if value is None:
+                value = build()
+                cache.set(key, value, timeout=None)
+            self.entries[name] = (version, value)
+        return value
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,171 @@
+from operator import attrgetter
+
+from django.db import models
+from rest_framework import serializers
+
+# Вид поля: как из значения атрибута получить значение в ответе
+VALUE, INTEGER, STRING, FILE, FIELD, METHOD, NESTED, NESTED_MANY = range(8)
+
+plans = {}
+
+
+def make_getter(source_attrs):
+    """ Атрибут объекта или ключ словаря из .values(): a.b или a__b """
+    if not source_attrs:
+        return lambda row: row
+    key = '__'.join(source_attrs)
+    get_attr = attrgetter('.'.join(source_attrs))
+
+    def get(row):
+        if not isinstance(row, dict):
+            return get_attr(row)
+        if key in row:
+            return row[key]
+        for attr in source_attrs:
+            row = row[attr]
+        return row
+    return get
+
+
+def get_model_field(serializer, source_attrs):
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None or len(source_attrs) != 1:
+        return None
+    return model._meta.get_field(source_attrs[0])
+
+
+def get_kind(field):
+    if isinstance(field, serializers.ListSerializer):
+        return NESTED_MANY
+    if isinstance(field, serializers.BaseSerializer):
+        return NESTED
+    if isinstance(field, serializers.SerializerMethodField):
+        return METHOD
+    if isinstance(field, serializers.FileField):
+        return FILE
+    if type(field) is serializers.ReadOnlyField:
+        return VALUE
+    if type(field) is serializers.IntegerField:
+        return INTEGER
+    to_representation = type(field).to_representation
+    if to_representation is serializers.CharField.to_representation:
+        return STRING
+    return FIELD
+
+
+def get_plan(serializer):
+    """ Разбор полей класса сериализатора, один раз на процесс.
+
+    compiled_sources сериализатора заменяет поле-метод вложенным
+    сериализатором по атрибуту (у словаря — ключу) строки:
+    {поле: (атрибут, класс сериализатора)}.
+    """
+    cls = type(serializer)
+    if cls not in plans:
+        sources = getattr(cls, 'compiled_sources', {})
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in sources:
+                source, _ = sources[name]
+                plan.append((
+                    name, NESTED_MANY, make_getter(source.split('.')), None
+                ))
+                continue
+            kind = get_kind(field)
+            extra = None
+            if kind == METHOD:
+                extra = field.method_name
+            elif kind == FILE:
+                extra = get_model_field(serializer, field.source_attrs)
+            getter = None if kind == METHOD else make_getter(
+                field.source_attrs
+            )
+            plan.append((name, kind, getter, extra))
+        plans[cls] = plan
+    return plans[cls]
+
+
+def get_items(value):
+    return value.all() if isinstance(value, models.Manager) else value
+
+
+def make_converter(name, kind, field, extra, serializer):
+    if kind == INTEGER:
+        return int
+    if kind == STRING:
+        return str
+    if kind == FIELD:
+        return field.to_representation
+    if kind == FILE:
+        def convert_file(value):
+            if isinstance(value, str) and extra is not None:
+                value = extra.attr_class(None, extra, value)
+            return field.to_representation(value)
+        return convert_file
+    if kind == NESTED:
+        return compile_serializer(field)
+    if kind == NESTED_MANY:
+        if name in getattr(serializer, 'compiled_sources', {}):
+            field = serializer.compiled_sources[name][1](
+                context=serializer.context
+            )
+        else:
+            field = field.child
+        convert = compile_serializer(field)
+        return lambda value: [convert(item) for item in get_items(value)]
+    return None
+
+
+def compile_serializer(serializer):
+    """ Функция объект → dict с тем же результатом, что to_representation.
+
+    Строится один раз на запрос по разобранным полям: вложенные
+    сериализаторы и методы не создаются заново для каждой строки.
+    Строки — объекты с prefetch или словари из .values(); у словаря
+    значения полей-методов берутся по имени поля, если они в нём есть.
+    """
+    fields = []
+    for name, kind, getter, extra in get_plan(serializer):
+        field = serializer.fields.get(name)
+        if kind == METHOD:
+            fields.append((name, kind, getattr(serializer, extra), None))
+        else:
+            fields.append((name, kind, getter, make_converter(
+                name, kind, field, extra, serializer
+            )))
+
+    def convert(row):
+        is_dict = isinstance(row, dict)
+        data = {}
+        for name, kind, get, to_representation in fields:
+            if kind == METHOD:
+                data[name] = (
+                    row[name] if is_dict and name in row else get(row)
+                )
+                continue
+            value = get(row)
+            if value is None:
+                data[name] = None
+            elif to_representation is None:
+                data[name] = value
+            else:
+                data[name] = to_representation(value)
+        return data
+    return convert
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """ many=True: одна функция преобразования на весь список """
+
+    def to_representation(self, data):
+        convert = compile_serializer(self.child)
+        return [convert(item) for item in get_items(data)]
+
+
+class CompiledSerializerMixin:
+    """ Быстрый вывод только для чтения по полям сериализатора """
+
+    def to_representation(self, instance):
+        return compile_serializer(self)(instance)
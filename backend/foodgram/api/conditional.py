@@ -0,0 +1,116 @@
+from functools import wraps
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from recipes.models import Recipe
+
+from .cache import (catalog_cache, get_user_key, get_version_time,
+                    get_versions, get_viewer_key)
+from .ranking import ORDERINGS, RANKING_VERSION_KEY
+
+# Меняется при правке полей автора рецептов, которые видны в ответах
+USERS_VERSION_KEY = 'users:version'
+USER_SHOWN_FIELDS = ('email', 'username', 'first_name', 'last_name')
+# Меняется при создании, правке и удалении рецептов
+RECIPES_VERSION_KEY = 'recipes:version'
+
+
+def check_conditional(validators, view, request, *args, **kwargs):
+    """ ETag, дата изменения и ответ 304, если у клиента всё актуально """
+    parts, last_modified = validators(view, request, *args, **kwargs)
+    etag = None
+    if parts is not None:
+        # У JSON и MessagePack одного ресурса разные ETag
+        etag = quote_etag(md5('|'.join(map(str, (
+            *parts, request.accepted_renderer.format
+        ))).encode()).hexdigest())
+    timestamp = last_modified and int(last_modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+    return etag, timestamp, response
+
+
+def set_validators(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        if etag is not None:
+            response['ETag'] = etag
+        if timestamp:
+            response['Last-Modified'] = http_date(timestamp)
+    patch_vary_headers(response, ('Accept', 'Authorization'))
+    return response
+
+
+def conditional(validators):
+    """ Условный GET для метода вьюсета.
+
+    validators(view, request, *args, **kwargs) возвращает части ETag и
+    дату изменения; при совпадении с заголовками запроса метод не
+    вызывается и клиент получает 304 Not Modified.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return method(view, request, *args, **kwargs)
+            etag, timestamp, response = check_conditional(
+                validators, view, request, *args, **kwargs
+            )
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+            return set_validators(response, etag, timestamp)
+        return wrapper
+    return decorator
+
+
+def get_viewer_keys(request):
+    """ Версии пользователей и, для вошедшего, его отметок """
+    if request.user.is_anonymous:
+        return [USERS_VERSION_KEY]
+    return [USERS_VERSION_KEY, get_viewer_key(request.user.id)]
+
+
+def recipe_list_validators(view, request, *args, **kwargs):
+    keys = [RECIPES_VERSION_KEY, catalog_cache.version_key]
+    # Очки популярности меняются без изменения самих рецептов
+    if request.query_params.get('ordering') in ORDERINGS:
+        keys.append(RANKING_VERSION_KEY)
+    return (
+        request.get_full_path(),
+        *get_versions(*keys, *get_viewer_keys(request))
+    ), None
+
+
+def recipe_validators(view, request, pk=None, *args, **kwargs):
+    modified = Recipe.objects.filter(pk=pk).values_list(
+        'modified', flat=True
+    ).first()
+    if modified is None:
+        return None, None
+    recipe_modified = modified
+    catalog, users, *viewer = get_versions(
+        catalog_cache.version_key, *get_viewer_keys(request)
+    )
+    if request.user.is_anonymous:
+        # В рецепте есть теги, ингредиенты и автор: их правка тоже
+        # меняет дату изменения ответа
+        modified = max(
+            modified, get_version_time(catalog), get_version_time(users)
+        )
+    else:
+        modified = None
+    return (pk, recipe_modified, catalog, users, *viewer), modified
+
+
+def catalog_validators(view, request, *args, **kwargs):
+    return (request.get_full_path(), catalog_cache.get_version()), None
+
+
+def user_validators(view, request, id=None, *args, **kwargs):
+    user_id = id or request.user.id
+    keys = [get_user_key(user_id)]
+    if request.user.is_authenticated:
+        keys.append(get_viewer_key(request.user.id))
+    return (user_id, *get_versions(*keys)), None
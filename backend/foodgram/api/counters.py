@@ -0,0 +1,47 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoritesList, Follow, Recipe, ShoppingList
+from users.models import User
+
+# Счётчик: модель, поле счётчика, модель связи и её поле-ссылка
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoritesList, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, field, delta, **filters):
+    """ Атомарно изменить счётчик через F(), не уходя ниже нуля """
+    if not delta:
+        return 0
+    queryset = model.objects.filter(**filters)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def get_actual_count(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{related_field: OuterRef('pk')})
+        .order_by().values(related_field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def repair_counters(dry_run=False):
+    """ Пересчитать расхождения счётчиков; вернуть их число по полям """
+    drift = {}
+    for model, field, related_model, related_field in COUNTERS:
+        actual = get_actual_count(related_model, related_field)
+        wrong = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        )
+        drift[f'{model._meta.label}.{field}'] = wrong.count()
+        if not dry_run:
+            model.objects.filter(pk__in=wrong.values('pk')).update(
+                **{field: actual}
+            )
+    return drift
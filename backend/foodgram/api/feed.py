@@ -0,0 +1,145 @@
+from collections import defaultdict
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import FeedEntry, Follow, Recipe
+from users.models import User
+
+
+def get_prune_key(user_id):
+    return f'feed:{user_id}:prune'
+
+
+def get_pushed_authors(author_ids):
+    """ Авторы, чьи рецепты раскладываются по лентам: рецепты популярных
+    читаются из таблицы рецептов. Число подписчиков берётся из базы,
+    а не из закэшированного пользователя запроса. """
+    return set(User.objects.filter(
+        id__in=author_ids,
+        followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('id', flat=True))
+
+
+def push(author_id, recipes):
+    """ Записать рецепты [(id, pub_date)] автора в ленты подписчиков.
+
+    Подписчики пишутся пачками по FEED_FANOUT_BATCH, вне транзакции
+    каждая пачка фиксируется сама.
+    """
+    batch_size = settings.FEED_FANOUT_BATCH
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(followers, batch_size))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create((
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            ) for user_id in batch for recipe_id, pub_date in recipes
+        ), batch_size=batch_size, ignore_conflicts=True)
+
+
+def fan_out_recipes(recipes):
+    """ Разложить новые рецепты [(id, автор, pub_date)] по лентам
+    подписчиков их авторов """
+    by_author = defaultdict(list)
+    for recipe_id, author_id, pub_date in recipes:
+        by_author[author_id].append((recipe_id, pub_date))
+    for author_id in get_pushed_authors(by_author):
+        push(author_id, by_author[author_id])
+
+
+def fan_out(recipe):
+    """ Разложить новый рецепт по лентам подписчиков автора после
+    фиксации транзакции, чтобы не держать её открытой на время записи """
+    transaction.on_commit(partial(
+        fan_out_recipes, [(recipe.id, recipe.author_id, recipe.pub_date)]
+    ))
+
+
+def backfill(user_id, author_id):
+    """ Добавить в ленту последние рецепты нового автора """
+    FeedEntry.objects.bulk_create((
+        FeedEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        ) for recipe_id, pub_date in Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'pub_date'
+        )[:settings.FEED_BACKFILL]
+    ), ignore_conflicts=True)
+
+
+def rebuild_feeds():
+    """ Заполнить ленты по всем подпискам последними FEED_BACKFILL
+    рецептами авторов; для подписок, загруженных в обход backfill.
+    Возвращает число авторов. """
+    authors = get_pushed_authors(
+        Follow.objects.values('author_id').distinct()
+    )
+    for author_id in authors:
+        recipes = list(Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'pub_date'
+        )[:settings.FEED_BACKFILL])
+        push(author_id, recipes)
+    return len(authors)
+
+
+def schedule_prune(user_id):
+    cache.set(get_prune_key(user_id), True, timeout=None)
+
+
+def prune(user_id):
+    """ Удалить записи авторов, от которых пользователь отписался """
+    if cache.get(get_prune_key(user_id)):
+        FeedEntry.objects.filter(user_id=user_id).exclude(
+            author_id__in=Follow.objects.filter(
+                user_id=user_id
+            ).values('author_id')
+        ).delete()
+        cache.delete(get_prune_key(user_id))
+
+
+def get_feed_page(user, position, size):
+    """ (pub_date, id) рецептов ленты после позиции курсора """
+    prune(user.id)
+    following = Follow.objects.filter(user=user)
+    entries = FeedEntry.objects.filter(
+        user=user, author_id__in=following.values('author_id')
+    )
+    pulled = list(following.filter(
+        author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+    recipes = Recipe.objects.filter(author_id__in=pulled)
+    if position is not None:
+        pub_date, recipe_id = position
+        entries = entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+        recipes = recipes.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=recipe_id)
+        )
+    rows = set(entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:size])
+    if pulled:
+        rows.update(recipes.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id'
+        )[:size])
+    return sorted(rows, reverse=True)[:size]
@@ -1,19 +1,23 @@
 from django_filters import rest_framework as filter
-from rest_framework.filters import SearchFilter
 from recipes.models import Recipe, Tag
 
+from .cache import catalog_cache
+from .ranking import ORDERINGS
+from .search import search_recipes
 
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+
+def get_tag_choices():
+    return catalog_cache.get('tag_choices', lambda: [
+        (slug, slug) for slug in Tag.objects.values_list('slug', flat=True)
+    ])
 
 
 class RecipeFilter(filter.FilterSet):
     author = filter.CharFilter()
-    tags = filter.ModelMultipleChoiceFilter(
+    tags = filter.MultipleChoiceFilter(
         field_name='tags__slug',
-        queryset=Tag.objects.all(),
+        choices=get_tag_choices,
         label='Tags',
-        to_field_name='slug'
     )
     is_favorited = filter.BooleanFilter(
         method='get_favorite'
@@ -21,11 +25,23 @@ class RecipeFilter(filter.FilterSet):
     is_in_shopping_cart = filter.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filter.CharFilter(method='get_search')
+    ordering = filter.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='get_ordering',
+        label='Ordering',
+    )
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
 
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
+
     def get_is_in_shopping_cart(self, queryset, name, value):
         return self._get_queryset(queryset, name, value, 'shopping_list')
 
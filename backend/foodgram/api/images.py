@@ -0,0 +1,149 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Recipe
+
+RENDITIONS_DIR = 'recipes/images/renditions'
+HASHED_STEM = re.compile(r'^[0-9a-f]{64}$')
+# Сколько символов base64 из начала строки декодируется для чтения
+# заголовка картинки до декодирования всей строки
+HEADER_CHARS = 64 * 1024
+
+
+def get_stem(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def has_renditions(name):
+    """ Уменьшенные копии есть только у файлов с именем-хэшем """
+    return bool(HASHED_STEM.match(get_stem(name)))
+
+
+def get_rendition_name(name, rendition):
+    extension = settings.RECIPE_IMAGE_FORMAT.lower()
+    return f'{RENDITIONS_DIR}/{get_stem(name)}_{rendition}.{extension}'
+
+
+def make_renditions(name):
+    """ Сохранить уменьшенные копии картинки, если их ещё нет """
+    sizes = {
+        get_rendition_name(name, rendition): size
+        for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items()
+    }
+    sizes = {
+        path: size for path, size in sizes.items()
+        if not default_storage.exists(path)
+    }
+    if not sizes:
+        return
+    image_format = settings.RECIPE_IMAGE_FORMAT
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        # JPEG сразу декодируется в уменьшенном масштабе
+        image.draft('RGB', max(sizes.values()))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = (
+            image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info
+        )
+        image = image.convert(
+            'RGBA' if has_alpha and image_format != 'JPEG' else 'RGB'
+        )
+    # От большей копии к меньшей: каждая уменьшается из предыдущей
+    for path, size in sorted(
+        sizes.items(), key=lambda item: item[1], reverse=True
+    ):
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(
+            buffer, image_format, quality=settings.RECIPE_IMAGE_QUALITY
+        )
+        default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+class RecipeImageField(Base64ImageField):
+    """ Картинка рецепта в base64.
+
+    Размер строки проверяется до декодирования, число пикселей — по
+    заголовку из начала строки до декодирования всей картинки. Файл
+    называется по sha256 содержимого, повторная загрузка той же картинки
+    переиспользует файл.
+    С rendition отдаёт ссылку на уменьшенную копию.
+    """
+
+    def __init__(self, *args, rendition=None, **kwargs):
+        self.rendition = rendition
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, base64_data):
+        if isinstance(base64_data, str):
+            payload = base64_data.partition(';base64,')[2] or base64_data
+            if len(payload) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise ValidationError(
+                    'Размер картинки больше '
+                    f'{settings.RECIPE_IMAGE_MAX_SIZE // 2 ** 20} МБ'
+                )
+            self.check_header(payload)
+        data = super().to_internal_value(base64_data)
+        name = Recipe._meta.get_field('image').generate_filename(
+            None, data.name
+        )
+        if default_storage.exists(name):
+            return name
+        return data
+
+    def get_file_name(self, decoded_file):
+        return hashlib.sha256(decoded_file).hexdigest()
+
+    def check_pixels(self, width, height):
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                f'Картинка больше {settings.RECIPE_IMAGE_MAX_PIXELS} пикселей'
+            )
+
+    def check_header(self, payload):
+        """ Число пикселей по заголовку из первых HEADER_CHARS символов.
+
+        Если заголовок не уместился (например, длинный EXIF у JPEG) или
+        начало строки не декодируется отдельно, проверка остаётся за
+        get_file_extension после декодирования.
+        """
+        if len(payload) <= HEADER_CHARS:
+            return
+        try:
+            size = Image.open(io.BytesIO(base64.b64decode(
+                payload[:HEADER_CHARS], validate=True
+            ))).size
+        except Image.DecompressionBombError:
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        except (binascii.Error, ValueError, OSError, SyntaxError):
+            return
+        self.check_pixels(*size)
+
+    def get_file_extension(self, filename, decoded_file):
+        try:
+            size = Image.open(io.BytesIO(decoded_file)).size
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        self.check_pixels(*size)
+        return super().get_file_extension(filename, decoded_file)
+
+    def to_representation(self, file):
+        if not (self.rendition and file and has_renditions(file.name)):
+            return super().to_representation(file)
+        url = default_storage.url(
+            get_rendition_name(file.name, self.rendition)
+        )
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,109 @@
+from functools import partial
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.models import FavoritesList, Recipe, ShoppingList
+
+from .cache import bump_version, get_viewer_key
+from .counters import change_counter
+from .ranking import marks_added, marks_removed
+from .shopping_cart import add_to_cart, remove_from_cart
+
+# Отметка: счётчик рецепта, действия со сводным списком покупок
+MARKS = {
+    FavoritesList: ('favorites_count', None, None),
+    ShoppingList: ('in_carts_count', add_to_cart, remove_from_cart),
+}
+# Вставка без чтения перед записью: несуществующие рецепты отсекает
+# SELECT, повторы — уникальное ограничение, RETURNING даёт созданные
+INSERT_SQL = '''
+    INSERT INTO {table} (user_id, scored, recipe_id)
+    SELECT %s, %s, id FROM {recipes} WHERE id IN ({ids})
+    ON CONFLICT (user_id, recipe_id) DO NOTHING
+    RETURNING recipe_id
+'''
+DELETE_SQL = '''
+    DELETE FROM {table} WHERE user_id = %s AND recipe_id IN ({ids})
+    RETURNING recipe_id, scored
+'''
+
+CREATED = 'created'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+DELETED = 'deleted'
+ABSENT = 'absent'
+
+
+def execute(sql, model, params, recipe_ids):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(
+            table=model._meta.db_table,
+            recipes=Recipe._meta.db_table,
+            ids=', '.join(['%s'] * len(recipe_ids)),
+        ), [*params, *recipe_ids])
+        return cursor.fetchall()
+
+
+def to_datetime(value):
+    """ Время из RETURNING: SQLite отдаёт строку без часового пояса """
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value
+
+
+def marks_changed(model, user_id, marks, delta):
+    """ То, что для одной записи делают сигналы, — для всех сразу.
+
+    marks — {рецепт: когда отметка учтена в популярности}.
+    """
+    if not marks:
+        return
+    recipe_ids = list(marks)
+    field, add, remove = MARKS[model]
+    change_counter(Recipe, field, delta, pk__in=recipe_ids)
+    if delta > 0:
+        marks_added(model, marks.items())
+    if delta < 0:
+        marks_removed(model, marks.items())
+    if delta > 0 and add:
+        add(user_id, recipe_ids)
+    if delta < 0 and remove:
+        remove([user_id], recipe_ids)
+    transaction.on_commit(partial(bump_version, get_viewer_key(user_id)))
+
+
+@transaction.atomic
+def add_marks(model, user_id, recipe_ids):
+    """ Отметить рецепты; вернуть {id: created | exists | not_found} """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    now = timezone.now()
+    created = {recipe_id: now for recipe_id, in execute(
+        INSERT_SQL, model,
+        [user_id, connection.ops.adapt_datetimefield_value(now)], recipe_ids
+    )}
+    marks_changed(model, user_id, created, 1)
+    rest = [pk for pk in recipe_ids if pk not in created]
+    found = set(Recipe.objects.filter(id__in=rest).values_list(
+        'id', flat=True
+    )) if rest else set()
+    return {
+        pk: CREATED if pk in created else EXISTS if pk in found else NOT_FOUND
+        for pk in recipe_ids
+    }
+
+
+@transaction.atomic
+def remove_marks(model, user_id, recipe_ids):
+    """ Снять отметки; вернуть {id: deleted | absent} """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    deleted = {
+        recipe_id: to_datetime(scored) for recipe_id, scored in execute(
+            DELETE_SQL, model, [user_id], recipe_ids
+        )
+    }
+    marks_changed(model, user_id, deleted, -1)
+    return {pk: DELETED if pk in deleted else ABSENT for pk in recipe_ids}
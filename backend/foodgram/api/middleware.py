@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+from core.db_router import (SAFE_METHODS, choose_read_database,
+                            pin_to_primary, read_database)
+
+logger = logging.getLogger('api.slow_requests')
+
+
+class QueryStats:
+    """ Статистика SQL-запросов одного HTTP-запроса """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.monotonic() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """ Сколько раз повторялись уже выполненные запросы """
+        return sum(
+            count - 1 for count in self.statements.values() if count > 1
+        )
+
+
+class QueryCountMiddleware:
+    """ Заголовки X-DB-* и журнал медленных запросов """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.monotonic()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(stats)
+                )
+            response = self.get_response(request)
+        elapsed = (time.monotonic() - start) * 1000
+
+        response['X-DB-Queries'] = stats.count
+        response['X-DB-Time'] = f'{stats.duration * 1000:.2f}'
+        response['X-DB-Duplicates'] = stats.duplicates
+        if (elapsed >= settings.SLOW_REQUEST_THRESHOLD_MS
+                or stats.count >= settings.SLOW_REQUEST_QUERIES):
+            logger.warning(
+                '%s %s: %.2f ms, %d queries (%d duplicates), db %.2f ms',
+                request.method, request.get_full_path(), elapsed,
+                stats.count, stats.duplicates, stats.duration * 1000
+            )
+        return response
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """ Чтение с реплики в безопасных запросах клиента без свежих записей.
+
+    Работает и в синхронной, и в асинхронной цепочке; выбранная база
+    хранится в contextvar и видна потокам sync_to_async.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.call_async(request)
+        token = read_database.set(choose_read_database(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        self.remember_write(request, response)
+        return response
+
+    async def call_async(self, request):
+        token = read_database.set(
+            await sync_to_async(choose_read_database)(request)
+        )
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        await sync_to_async(self.remember_write)(request, response)
+        return response
+
+    def remember_write(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request)
@@ -1,6 +1,149 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """ Постраничный вывод по ключу сортировки без COUNT и OFFSET """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering=('-pub_date', '-id')):
+        self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_position_filter(self, position):
+        """ (a, b) < (x, y) в виде a < x OR (a = x AND b < y) """
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, position):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            field = name.lstrip('-')
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(b64decode(encoded.encode()).decode())
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (BinasciiError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        values = [
+            field.value_to_string(instance) for field in self.fields
+        ]
+        return b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class FeedPagination(KeysetPagination):
+    """ Курсор по (pub_date, id) для страниц, собираемых функцией """
+
+    def paginate_feed(self, queryset, request, load_page):
+        """ load_page(position, size) возвращает пары (pub_date, id) """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+        rows = load_page(self.decode_cursor(request), self.page_size + 1)
+        self.has_next = len(rows) > self.page_size
+        ids = [pk for _, pk in rows[:self.page_size]]
+        recipes = queryset.in_bulk(ids)
+        self.page = [recipes[pk] for pk in ids if pk in recipes]
+        return self.page
+
+
+class ListPagination(PageNumberPagination):
+    """ Номера страниц по готовому списку """
+    page_size_query_param = 'limit'
+    page_size = 6
+
+
+class EstimatedList(list):
+    """ Начало списка с оценкой полной длины для ListPagination """
+
+    def __init__(self, items, estimate):
+        super().__init__(items)
+        self.estimate = estimate
+
+    def __len__(self):
+        return self.estimate
 
 
 class CatsPagination(PageNumberPagination):
+    """ Номера страниц, курсор по запросу с параметром ?cursor= """
     page_size_query_param = 'limit'
     page_size = 6
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(
+                getattr(view, 'keyset_ordering', ('-pub_date', '-id'))
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
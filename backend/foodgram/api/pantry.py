@@ -0,0 +1,156 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from recipes.models import IngredientInRecipe
+
+SEQUENCE_KEY = 'pantry:sequence'
+
+
+def get_change_key(number):
+    return f'pantry:change:{number}'
+
+
+def record_change(recipe_ids):
+    """ Сообщить процессам, что у рецептов поменялся состав """
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    number = cache.incr(SEQUENCE_KEY)
+    cache.set(
+        get_change_key(number), list(recipe_ids),
+        settings.PANTRY_CHANGE_TIMEOUT
+    )
+
+
+def load_ingredients(recipe_ids=None):
+    """ {рецепт: ингредиенты} из базы, всё или для recipe_ids """
+    items = IngredientInRecipe.objects.all()
+    if recipe_ids is not None:
+        items = items.filter(recipe_id__in=recipe_ids)
+    ingredients = defaultdict(set)
+    for recipe_id, ingredient_id in items.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator():
+        ingredients[recipe_id].add(ingredient_id)
+    return ingredients
+
+
+class PantryIndex:
+    """ Рецепты по ингредиентам в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id
+    рецептов, для каждого рецепта — его ингредиенты. Изменения
+    составов приходят через журнал в общем кэше: номер последнего
+    изменения читается на каждом запросе, новые рецепты догружаются
+    из базы. Если журнал отстал больше PANTRY_MAX_CHANGES или записи
+    истекли, индекс собирается заново.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sequence = None
+        self.postings = {}
+        self.ingredients = {}
+
+    def build(self, sequence):
+        ingredients = load_ingredients()
+        postings = defaultdict(list)
+        for recipe_id, items in ingredients.items():
+            for ingredient_id in items:
+                postings[ingredient_id].append(recipe_id)
+        self.postings, self.ingredients = {
+            ingredient_id: array('q', sorted(recipe_ids))
+            for ingredient_id, recipe_ids in postings.items()
+        }, {
+            recipe_id: frozenset(items)
+            for recipe_id, items in ingredients.items()
+        }
+        self.sequence = sequence
+
+    def apply_changes(self, sequence):
+        """ Догрузить изменённые рецепты; False, если журнал неполон.
+
+        Словари и изменённые массивы собираются заново: поиск без
+        блокировки дочитывает прежние.
+        """
+        keys = [
+            get_change_key(number)
+            for number in range(self.sequence + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        recipe_ids = set(chain.from_iterable(changes.values()))
+        loaded = load_ingredients(recipe_ids)
+        postings, ingredients = dict(self.postings), dict(self.ingredients)
+        copied = set()
+
+        def get_posting(ingredient_id):
+            if ingredient_id not in copied:
+                copied.add(ingredient_id)
+                postings[ingredient_id] = array(
+                    'q', postings.get(ingredient_id, ())
+                )
+            return postings[ingredient_id]
+
+        for recipe_id in recipe_ids:
+            for ingredient_id in ingredients.pop(recipe_id, ()):
+                posting = get_posting(ingredient_id)
+                del posting[bisect_left(posting, recipe_id)]
+            if recipe_id in loaded:
+                for ingredient_id in loaded[recipe_id]:
+                    insort(get_posting(ingredient_id), recipe_id)
+                ingredients[recipe_id] = frozenset(loaded[recipe_id])
+        self.postings, self.ingredients = postings, ingredients
+        self.sequence = sequence
+        return True
+
+    def sync(self):
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        if sequence == self.sequence:
+            return
+        with self.lock:
+            if sequence == self.sequence:
+                return
+            if self.sequence is None or not (
+                self.sequence < sequence
+                <= self.sequence + settings.PANTRY_MAX_CHANGES
+                and self.apply_changes(sequence)
+            ):
+                self.build(sequence)
+
+    def warm_up(self):
+        """ Собрать индекс при старте процесса, а не на первом запросе """
+        try:
+            self.sync()
+        except DatabaseError:
+            pass
+
+    def search(self, ingredient_ids, max_missing=0):
+        """ [(не хватает, id рецепта)]: сначала те, где не хватает меньше,
+        среди них — по убыванию id. max_missing=0 — всё есть
+        в ingredient_ids. """
+        self.sync()
+        # Под блокировкой только ссылки: обновление индекса подставляет
+        # новые словари и массивы, а не меняет эти
+        with self.lock:
+            postings, ingredients = self.postings, self.ingredients
+        matched = Counter(chain.from_iterable(
+            postings.get(ingredient_id, ())
+            for ingredient_id in set(ingredient_ids)
+        ))
+        found = [
+            (len(ingredients[recipe_id]) - count, recipe_id)
+            for recipe_id, count in matched.items()
+        ]
+        found = [item for item in found if item[0] <= max_missing]
+        found.sort(key=lambda item: (item[0], -item[1]))
+        return found
+
+
+pantry_index = PantryIndex()
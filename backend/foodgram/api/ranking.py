@@ -0,0 +1,149 @@
+import time
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from recipes.models import FavoritesList, RankingEpoch, Recipe, ShoppingList
+
+from .cache import bump_version
+
+RANKING_VERSION_KEY = 'ranking:version'
+EPOCH_KEY = 'ranking:epoch'
+# ?ordering= → сортировка рецептов, id — для равных очков и курсора
+ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'trending': ('-trending', '-id'),
+}
+WEIGHTS = {
+    FavoritesList: 'RANKING_FAVORITE_WEIGHT',
+    ShoppingList: 'RANKING_CART_WEIGHT',
+}
+# Больше стольких удвоений множителя без пересчёта не допускаем:
+# до переполнения float остаётся большой запас
+MAX_DOUBLINGS = 512
+
+
+def get_epoch_row():
+    epoch = RankingEpoch.objects.select_for_update().first()
+    if epoch is None:
+        epoch = RankingEpoch.objects.create(started=timezone.now())
+    return epoch
+
+
+def get_epoch():
+    """ Начало отсчёта (timestamp) из общего кэша или из базы """
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        started = RankingEpoch.objects.values_list(
+            'started', flat=True
+        ).first()
+        if started is None:
+            with transaction.atomic():
+                started = get_epoch_row().started
+        epoch = started.timestamp()
+        cache.set(EPOCH_KEY, epoch, timeout=None)
+    return epoch
+
+
+def epoch_changed(epoch):
+    cache.set(EPOCH_KEY, epoch, timeout=None)
+    bump_version(RANKING_VERSION_KEY)
+
+
+def add_score(marks, weight):
+    """ Добавить рецептам вклад отметок [(рецепт, когда учтена)].
+
+    Вклад отметки со временем уменьшается вдвое за RANKING_HALF_LIVES
+    секунд. Чтобы не пересчитывать старые отметки на каждом событии,
+    новая отметка записывается в масштабе начала отсчёта: с множителем
+    2 ** (прошло / период). У всех рецептов очки затухают одинаково,
+    и порядок по хранимым очкам тот же, что по затухшим. Снятая
+    отметка вычитается с весом -weight и тем же временем, так что
+    поставленная и снятая отметка в сумме ничего не дают. Ниже нуля
+    очки не опускаются: у отметок, поставленных до учёта времени,
+    момент известен приблизительно.
+    """
+    epoch = get_epoch()
+    if time.time() - epoch > (
+        MAX_DOUBLINGS * min(settings.RANKING_HALF_LIVES.values())
+    ):
+        renormalise_scores()
+        epoch = time.time()
+    amounts = defaultdict(lambda: defaultdict(float))
+    for recipe_id, scored in marks:
+        elapsed = scored.timestamp() - epoch
+        for field, half_life in settings.RANKING_HALF_LIVES.items():
+            amounts[field][recipe_id] += weight * 2 ** (elapsed / half_life)
+    if not amounts:
+        return
+    Recipe.objects.filter(pk__in=[
+        recipe_id for recipe_id, _ in marks
+    ]).update(**{
+        field: Greatest(F(field) + Case(
+            *(When(pk=pk, then=Value(amount))
+              for pk, amount in values.items()),
+            default=Value(0.0), output_field=FloatField(),
+        ), Value(0.0))
+        for field, values in amounts.items()
+    })
+    transaction.on_commit(partial(bump_version, RANKING_VERSION_KEY))
+
+
+def marks_added(model, marks):
+    """ Рецепты добавили в избранное или список покупок """
+    add_score(marks, getattr(settings, WEIGHTS[model]))
+
+
+def marks_removed(model, marks):
+    """ Отметки сняты: вычесть вклад, записанный при их добавлении """
+    add_score(marks, -getattr(settings, WEIGHTS[model]))
+
+
+@transaction.atomic
+def renormalise_scores():
+    """ Перенести начало отсчёта на текущий момент.
+
+    Все очки делятся на накопившийся множитель, чтобы он не рос без
+    предела; порядок рецептов не меняется. Процессы, не успевшие
+    увидеть новое начало отсчёта, запишут отметку с чуть большим
+    весом — на 2 ** (интервал пересчёта / период). Возвращает число
+    рецептов.
+    """
+    epoch = get_epoch_row()
+    now = timezone.now()
+    elapsed = (now - epoch.started).total_seconds()
+    count = Recipe.objects.update(**{
+        field: F(field) * 2 ** (-elapsed / half_life)
+        for field, half_life in settings.RANKING_HALF_LIVES.items()
+    })
+    epoch.started = now
+    epoch.save(update_fields=('started',))
+    transaction.on_commit(partial(epoch_changed, now.timestamp()))
+    return count
+
+
+@transaction.atomic
+def reset_scores():
+    """ Очки по счётчикам, как если бы все отметки поставили сейчас """
+    epoch = get_epoch_row()
+    epoch.started = timezone.now()
+    epoch.save(update_fields=('started',))
+    for model in WEIGHTS:
+        model.objects.update(scored=epoch.started)
+    score = (
+        F('favorites_count') * settings.RANKING_FAVORITE_WEIGHT
+        + F('in_carts_count') * settings.RANKING_CART_WEIGHT
+    )
+    count = Recipe.objects.update(
+        **{field: score for field in settings.RANKING_HALF_LIVES}
+    )
+    transaction.on_commit(
+        partial(epoch_changed, epoch.started.timestamp())
+    )
+    return count
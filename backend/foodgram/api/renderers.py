@@ -0,0 +1,106 @@
+import math
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Как в JSONRenderer: символы, ломающие JSON внутри <script>
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+def has_non_finite_floats(data):
+    """ Есть ли NaN или бесконечности: orjson пишет их как null """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        for item in value.values() if isinstance(value, dict) else value:
+            if isinstance(item, (dict, list, tuple)):
+                stack.append(item)
+            elif isinstance(item, float) and not math.isfinite(item):
+                return True
+    return False
+
+
+def encode_default(obj):
+    """ Типы, которые orjson и msgpack не знают, — как в DRF """
+    return JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """ JSONRenderer на orjson.
+
+    Обычному JSONRenderer отдаются отступы (браузер, ?indent), то, что
+    orjson не кодирует (например, целые больше 64 бит), и NaN или
+    бесконечности: на них, как и в DRF, ValueError. Байты совпадают с
+    JSONRenderer, кроме записи дробей: orjson пишет экспоненту без «+»
+    и ведущих нулей (1e16, 1.5e-7 вместо 1e+16, 1.5e-07), а числа от
+    1e-5 до 1e-4 — без экспоненты (0.00001 вместо 1e-05). В ответах api
+    дробей нет.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=encode_default, option=(
+                orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            ))
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'null' in content and has_non_finite_floats(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        for character, escaped in LINE_SEPARATORS:
+            content = content.replace(character, escaped)
+        return content
+
+
+class FastJSONParser(JSONParser):
+    """ JSONParser на orjson """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """ MessagePack для внутренних клиентов: Accept: application/msgpack """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,217 @@
+import re
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from recipes.models import IngredientInRecipe, Ingredients, Recipe
+
+from .cache import catalog_cache
+
+# Поисковый документ рецепта: название, ингредиенты и текст с убывающим
+# весом. Таблица создаётся миграцией recipes 0010 только для PostgreSQL
+# (tsvector с GIN-индексом) и SQLite (виртуальная таблица FTS5).
+SEARCH_TABLE = 'recipes_recipesearch'
+SEARCH_BATCH = 500
+SEARCH_WORD = re.compile(r'\w+')
+
+
+def fold_yo(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+AGGREGATE_SQL = {
+    'postgresql': "coalesce(string_agg({}, ' '), '')",
+    'sqlite': "coalesce(group_concat({}, ' '), '')",
+}
+DOCUMENT_SQL = {
+    'postgresql': '''
+        INSERT INTO {search} (recipe_id, document)
+        SELECT recipe.id,
+            setweight(to_tsvector('russian', {name}), 'A')
+            || setweight(to_tsvector('russian', {ingredients}), 'B')
+            || setweight(to_tsvector('russian', {text}), 'C')
+        {source}
+        ON CONFLICT (recipe_id) DO UPDATE SET document = excluded.document
+    ''',
+    'sqlite': '''
+        INSERT INTO {search} (rowid, name, ingredients, text)
+        SELECT recipe.id, {name}, {ingredients}, {text}
+        {source}
+    ''',
+}
+DOCUMENT_SOURCE = '''
+    FROM {recipes} AS recipe
+    LEFT JOIN {items} AS item ON item.recipe_id = recipe.id
+    LEFT JOIN {ingredients} AS ingredient
+        ON ingredient.id = item.ingredient_id
+    WHERE recipe.id IN ({ids})
+    GROUP BY recipe.id
+'''
+# Отбор id и оценка релевантности (больше — лучше)
+MATCH_SQL = {
+    'postgresql': (
+        "SELECT recipe_id FROM {search} "
+        "WHERE document @@ to_tsquery('russian', %s)",
+        "SELECT ts_rank(document, to_tsquery('russian', %s)) "
+        "FROM {search} WHERE recipe_id = {recipes}.id",
+    ),
+    'sqlite': (
+        "SELECT rowid FROM {search} WHERE {search} MATCH %s",
+        "SELECT -bm25({search}, 10.0, 5.0, 1.0) FROM {search} "
+        "WHERE {search} MATCH %s AND rowid = {recipes}.id",
+    ),
+}
+
+
+def get_document_sql(ids):
+    vendor = connection.vendor
+    return DOCUMENT_SQL[vendor].format(
+        search=SEARCH_TABLE,
+        name=fold_yo('recipe.name'),
+        text=fold_yo('recipe.text'),
+        ingredients=AGGREGATE_SQL[vendor].format(fold_yo('ingredient.name')),
+        source=DOCUMENT_SOURCE.format(
+            recipes=Recipe._meta.db_table,
+            items=IngredientInRecipe._meta.db_table,
+            ingredients=Ingredients._meta.db_table,
+            ids=', '.join(['%s'] * len(ids)),
+        ),
+    )
+
+
+def update_search_documents(recipe_ids):
+    """ Пересобрать поисковые документы рецептов пачками """
+    if connection.vendor not in DOCUMENT_SQL:
+        return
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), SEARCH_BATCH):
+        ids = recipe_ids[start:start + SEARCH_BATCH]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                delete_search_documents(ids, cursor)
+            cursor.execute(get_document_sql(ids), ids)
+
+
+def delete_search_documents(recipe_ids, cursor=None):
+    """ В FTS5 нет внешних ключей, документы удаляются явно """
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    sql = 'DELETE FROM {} WHERE rowid IN ({})'.format(
+        SEARCH_TABLE, ', '.join(['%s'] * len(recipe_ids))
+    )
+    if cursor is not None:
+        cursor.execute(sql, recipe_ids)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(sql, recipe_ids)
+
+
+def get_search_query(value):
+    """ Слова запроса как префиксы, все обязательны """
+    words = SEARCH_WORD.findall(value.replace('ё', 'е').replace('Ё', 'Е'))
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f'{word}:*' for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, value):
+    """ Рецепты по запросу, самые релевантные первыми """
+    if connection.vendor not in MATCH_SQL:
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        )
+    query = get_search_query(value)
+    if not query:
+        return queryset
+    match, rank = (
+        sql.format(search=SEARCH_TABLE, recipes=Recipe._meta.db_table)
+        for sql in MATCH_SQL[connection.vendor]
+    )
+    return queryset.filter(
+        id__in=RawSQL(match, (query,))
+    ).annotate(
+        search_rank=RawSQL(rank, (query,), output_field=FloatField())
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+class IngredientIndex:
+    """ Поиск ингредиентов в памяти: сначала по началу названия,
+    затем по вхождению в любом месте. Индекс пересобирается при смене
+    версии справочников. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+        self.version = None
+
+    def build(self):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredients.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        trigrams = {}
+        for position, key in enumerate(keys):
+            for trigram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                trigrams.setdefault(trigram, []).append(position)
+        return keys, items, trigrams
+
+    def get_state(self):
+        version = catalog_cache.get_version()
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.state = self.build()
+                    self.version = version
+        return self.state
+
+    def search(self, query, limit=None):
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        query = query.strip().casefold()
+        if not query:
+            return []
+        keys, items, trigrams = self.get_state()
+
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit and (
+            keys[end].startswith(query)
+        ):
+            end += 1
+        found = items[start:end]
+        if len(found) == limit:
+            return found
+
+        if len(query) < 3:
+            candidates = range(len(keys))
+        else:
+            postings = sorted(
+                (trigrams.get(query[i:i + 3], ()) for i in range(
+                    len(query) - 2
+                )),
+                key=len
+            )
+            candidates = set(postings[0]).intersection(*postings[1:])
+        matches = []
+        for position in candidates:
+            offset = keys[position].find(query)
+            if offset > 0:
+                matches.append((offset, position))
+        matches.sort()
+        found.extend(
+            items[position] for _, position in matches[:limit - len(found)]
+        )
+        return found
+
+
+ingredient_index = IngredientIndex()
@@ -1,15 +1,21 @@
 from django.conf import settings
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework.exceptions import ValidationError
-from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework import serializers
 
-from recipes.models import (FavoritesList, Follow, Ingredients,
-                            IngredientInRecipe, Recipe, Tag, ShoppingList)
+from recipes.models import Ingredients, IngredientInRecipe, Recipe, Tag
 from users.models import User
 
+from .compiled import CompiledListSerializer, CompiledSerializerMixin
+from .feed import fan_out
+from .images import RecipeImageField, make_renditions
+from .search import update_search_documents
+from .signals import ingredients_changed
+from .shopping_cart import add_recipe_to_carts, remove_recipe_from_carts
+from .viewer import get_viewer
+
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     """ Сериализатор создания пользователя. """
@@ -31,11 +37,11 @@ class CustomUserSerializer(UserSerializer):
                   )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return request is not None and (
-            request.user.is_authenticated and Follow.objects.filter(
-                user=request.user, author=obj
-            ).exists()
+            get_viewer(request).is_subscribed(obj.id)
         )
 
 
@@ -66,8 +72,11 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     """ Сериализатор для просмотра рецепта"""
+    compiled_sources = {
+        'ingredients': ('ingredientinrecipe_set', IngredientRecipeSerializer),
+    }
     tags = TagSerializer(many=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
@@ -82,40 +91,83 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time'
                   )
+        list_serializer_class = CompiledListSerializer
 
     def get_ingredients(self, obj):
-        ingredients = IngredientInRecipe.objects.filter(recipe=obj)
+        ingredients = obj.ingredientinrecipe_set.all()
         return IngredientRecipeSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return request is not None and (
-            request.user.is_authenticated and FavoritesList.objects.filter(
-                user=request.user, recipe__id=obj.id).exists())
+            get_viewer(request).is_favorited(obj.id)
+        )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return request is not None and (
-            request.user.is_authenticated and ShoppingList.objects.filter(
-                user=request.user, recipe__id=obj.id).exists())
+            get_viewer(request).is_in_shopping_cart(obj.id)
+        )
+
+
+class RecipeListSerializer(RecipeSerializer):
+    """ Рецепт в списке: картинка среднего размера """
+    image = RecipeImageField(rendition='medium', read_only=True)
+
+
+class PantryRecipeSerializer(RecipeListSerializer):
+    """ Рецепт из поиска по продуктам: сколько ингредиентов не хватает """
+    missing = serializers.ReadOnlyField()
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('missing',)
+
+
+class PantrySerializer(serializers.Serializer):
+    """ Параметры поиска по продуктам """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.PANTRY_MAX_INGREDIENTS,
+    )
+    missing = serializers.IntegerField(
+        min_value=0, max_value=settings.PANTRY_MAX_MISSING, default=0
+    )
 
 
 class AddIngredientRecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор добавление ингридиентов в рецепт """
     id = serializers.IntegerField()
-    amount = serializers.IntegerField()
+    amount = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'amount')
 
 
+def check_ids(ids, model, name):
+    """ Повторы и несуществующие id проверяются одним запросом """
+    if len(set(ids)) != len(ids):
+        raise ValidationError(f'{name} не должны повторяться')
+    missing = set(ids) - set(
+        model.objects.filter(id__in=ids).values_list('id', flat=True)
+    )
+    if missing:
+        raise ValidationError(
+            f'{name} не найдены: {", ".join(map(str, sorted(missing)))}'
+        )
+
+
 class CreateRecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор  создания, редактирования и удаления рецепта"""
     author = CustomUserSerializer(read_only=True)
     ingredients = AddIngredientRecipeSerializer(many=True)
-    tags = PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
-    image = Base64ImageField(use_url=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RecipeImageField(use_url=True)
 
     class Meta:
         model = Recipe
@@ -123,15 +175,60 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                   'image', 'name', 'text', 'cooking_time'
                   )
 
+    def validate_ingredients(self, value):
+        check_ids([item['id'] for item in value], Ingredients, 'Ингредиенты')
+        return value
+
+    def validate_tags(self, value):
+        check_ids(value, Tag, 'Теги')
+        return value
+
     def create_ingredients(self, ingredients, recipe):
         IngredientInRecipe.objects.bulk_create(
             [IngredientInRecipe(
-                ingredient=Ingredients.objects.get(id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
 
+    def update_ingredients(self, ingredients, recipe):
+        """ Записать только разницу между старым и новым составом """
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        current = {
+            item.ingredient_id: item
+            for item in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        changed = [
+            item for ingredient_id, item in current.items()
+            if ingredient_id in amounts
+            and item.amount != amounts[ingredient_id]
+        ]
+        removed = current.keys() - amounts.keys()
+        added = [
+            item for item in ingredients if item['id'] not in current
+        ]
+        if not (changed or removed or added):
+            return
+        remove_recipe_from_carts(recipe.id)
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        for item in changed:
+            item.amount = amounts[item.ingredient_id]
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(recipe=recipe, ingredients=added)
+        add_recipe_to_carts(recipe.id)
+        ingredients_changed.send(sender=Recipe, recipe_ids=[recipe.id])
+
+    def update_tags(self, tags, recipe):
+        current = set(recipe.tags.values_list('id', flat=True))
+        if current - set(tags):
+            recipe.tags.remove(*(current - set(tags)))
+        if set(tags) - current:
+            recipe.tags.add(*(set(tags) - current))
+
     @transaction.atomic
     def create(self, validated_data):
         """ Создание рецепта """
@@ -143,24 +240,34 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         )
         self.create_ingredients(recipe=recipe, ingredients=ingredients)
         recipe.tags.set(tags)
+        update_search_documents([recipe.id])
+        ingredients_changed.send(sender=Recipe, recipe_ids=[recipe.id])
+        fan_out(recipe)
+        transaction.on_commit(lambda: make_renditions(recipe.image.name))
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         """ Изменение рецепта """
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients(recipe=instance,
-                                ingredients=ingredients
-                                )
-        instance.save()
+        if tags is not None:
+            self.update_tags(tags, instance)
+        if ingredients is not None:
+            self.update_ingredients(ingredients, instance)
+        update_search_documents([instance.id])
+        if 'image' in validated_data:
+            transaction.on_commit(
+                lambda: make_renditions(instance.image.name)
+            )
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], 'tags', Prefetch(
+            'ingredientinrecipe_set',
+            IngredientInRecipe.objects.select_related('ingredient')
+        ))
         return RecipeSerializer(instance, context={
             'request': self.context.get('request')
         }).data
@@ -168,56 +275,20 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
 class RecipeShortInfo(serializers.ModelSerializer):
     """ Сериализатор отображения избранного """
+    image = RecipeImageField(rendition='thumb', read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class ShoppingListSerializer(serializers.ModelSerializer):
-    """ Сериализатор списка покупок """
-    class Meta:
-        model = ShoppingList
-        fields = ('recipe', 'user')
-
-    def validate(self, data):
-        request = self.context.get('request')
-        recipe = data['recipe']
-        if ShoppingList.objects.filter(
-            user=request.user, recipe=recipe
-        ).exists():
-            raise ValidationError({
-                'errors': 'Рецепт уже есть в корзине.'
-            })
-        return data
-
-    def to_representation(self, instance):
-        return RecipeShortInfo(instance.recipe, context={
-            'request': self.context.get('request')
-        }).data
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    """ Сериализатор избранного """
-    class Meta:
-        model = FavoritesList
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        recipe = data['recipe']
-        if recipe in request.user.recipes.all():
-            raise ValidationError({
-                'errors': 'Уже есть в избранном!!'
-            })
-        return data
-
-    def to_representation(self, instance):
-        return RecipeShortInfo(instance.recipe, context={
-            'request': self.context.get('request')
-        }).data
+class RecipeIdsSerializer(serializers.Serializer):
+    """ Список рецептов для пакетного добавления и удаления """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_MARKS_BATCH_LIMIT,
+    )
 
 
 class FollowSerializer(CustomUserSerializer):
@@ -236,12 +307,11 @@ class FollowSerializer(CustomUserSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        limit = request.query_params.get(
-            'recipes_limit', settings.RECIPES_LIMIT
-        )
-        recipes = obj.recipes.select_related('author').all()[:int(limit)]
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[:settings.RECIPES_LIMIT]
         serializer = RecipeShortInfo(recipes, many=True, read_only=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
@@ -0,0 +1,273 @@
+import csv
+import io
+import os
+from datetime import date
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, router, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from recipes.models import (IngredientInRecipe, ShoppingCartIngredient,
+                            ShoppingList)
+
+from .cache import bump_version, get_versions
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+UPSERT_SQL = '''
+    INSERT INTO {cart} (user_id, ingredient_id, amount)
+    SELECT {user}, item.ingredient_id, SUM(item.amount)
+    FROM {items} AS item {join}
+    WHERE {where}
+    GROUP BY {group}
+    ON CONFLICT (user_id, ingredient_id)
+    DO UPDATE SET amount = {cart}.amount + excluded.amount
+'''
+
+
+def get_cart_key(user_id):
+    """ Версия сводного списка покупок пользователя """
+    return f'cart:{user_id}:version'
+
+
+def bump_carts(user_ids):
+    for user_id in user_ids:
+        transaction.on_commit(partial(bump_version, get_cart_key(user_id)))
+
+
+def add_to_cart(user_id, recipe_ids):
+    """ Прибавить ингредиенты рецептов к списку покупок пользователя """
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL.format(
+            cart=ShoppingCartIngredient._meta.db_table,
+            items=IngredientInRecipe._meta.db_table,
+            user='%s',
+            join='',
+            where='item.recipe_id IN ({})'.format(
+                ', '.join(['%s'] * len(recipe_ids))
+            ),
+            group='item.ingredient_id',
+        ), [user_id, *recipe_ids])
+    bump_carts([user_id])
+
+
+def remove_from_cart(user_ids, recipe_ids):
+    """ Вычесть ингредиенты рецептов из списков покупок пользователей """
+    items = IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+    carts = ShoppingCartIngredient.objects.filter(user_id__in=user_ids)
+    carts.filter(
+        ingredient_id__in=items.values('ingredient_id')
+    ).update(amount=F('amount') - Subquery(
+        items.filter(ingredient_id=OuterRef('ingredient_id'))
+        .values('ingredient_id').annotate(total=Sum('amount'))
+        .values('total')
+    ))
+    carts.filter(amount__lte=0).delete()
+    bump_carts(user_ids)
+
+
+def get_recipe_carts(recipe_id):
+    return list(ShoppingList.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True))
+
+
+def add_recipe_to_carts(recipe_id):
+    """ Прибавить ингредиенты рецепта во всех корзинах, где он лежит """
+    user_ids = get_recipe_carts(recipe_id)
+    if not user_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL.format(
+            cart=ShoppingCartIngredient._meta.db_table,
+            items=IngredientInRecipe._meta.db_table,
+            user='shopping.user_id',
+            join=f'JOIN {ShoppingList._meta.db_table} AS shopping '
+                 'ON shopping.recipe_id = item.recipe_id',
+            where='item.recipe_id = %s',
+            group='shopping.user_id, item.ingredient_id',
+        ), [recipe_id])
+    bump_carts(user_ids)
+
+
+def remove_recipe_from_carts(recipe_id):
+    """ Вычесть ингредиенты рецепта во всех корзинах, где он лежит """
+    user_ids = get_recipe_carts(recipe_id)
+    if user_ids:
+        remove_from_cart(user_ids, [recipe_id])
+
+
+def get_expected_carts(user_ids):
+    """ {(пользователь, ингредиент): количество} по рецептам в корзинах """
+    return {
+        (row['recipe__shopping_list__user'], row['ingredient']): row['total']
+        for row in IngredientInRecipe.objects.filter(
+            recipe__shopping_list__user__in=user_ids
+        ).values(
+            'recipe__shopping_list__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+    }
+
+
+def repair_carts(dry_run=False, batch_size=1000):
+    """ Пересобрать сводные списки покупок, которые разошлись с
+    ShoppingList; вернуть число неверных строк.
+
+    Нужна после массовой загрузки ShoppingList в обход add_to_cart.
+    """
+    user_ids = sorted(set(ShoppingList.objects.values_list(
+        'user_id', flat=True
+    )) | set(ShoppingCartIngredient.objects.values_list(
+        'user_id', flat=True
+    )))
+    drift = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        expected = get_expected_carts(batch)
+        actual = {
+            (user_id, ingredient_id): (pk, amount)
+            for pk, user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.filter(
+                user_id__in=batch
+            ).values_list('id', 'user_id', 'ingredient_id', 'amount')
+        }
+        wrong = {
+            key for key, (_, amount) in actual.items()
+            if expected.get(key) != amount
+        }
+        missing = {
+            key for key, amount in expected.items()
+            if key not in actual or actual[key][1] != amount
+        }
+        drift += len(wrong | missing)
+        if dry_run or not (wrong or missing):
+            continue
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.filter(
+                id__in=[actual[key][0] for key in wrong]
+            ).delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                ShoppingCartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=expected[user_id, ingredient_id],
+                ) for user_id, ingredient_id in missing
+            )
+            bump_carts({user_id for user_id, _ in wrong | missing})
+    return drift
+
+
+def get_cart_rows(user, using):
+    return ShoppingCartIngredient.objects.using(using).filter(
+        user=user, amount__gt=0
+    ).order_by('ingredient__name').values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).iterator()
+
+
+def render_txt(user, today, rows):
+    yield (
+        f'Список покупок для: {user.get_full_name()}\n\n'
+        f'Дата: {today:%Y-%m-%d}\n\n'
+    )
+    separator = ''
+    for name, measurement_unit, amount in rows:
+        yield f'{separator}- {name}({measurement_unit}) - {amount}'
+        separator = '\n'
+    yield f'\n\nFoodgram ({today:%Y})'
+
+
+def render_csv(user, today, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row):
+        writer.writerow(row)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(('Ингредиент', 'Единица измерения', 'Количество'))
+    for row in rows:
+        yield line(row)
+
+
+def render_pdf(user, today, rows):
+    font = 'Helvetica'
+    if os.path.exists(settings.SHOPPING_CART_PDF_FONT):
+        font = 'ShoppingCartFont'
+        pdfmetrics.registerFont(
+            TTFont(font, settings.SHOPPING_CART_PDF_FONT)
+        )
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    lines = [
+        f'Список покупок для: {user.get_full_name()}',
+        f'Дата: {today:%Y-%m-%d}',
+        '',
+        *(
+            f'- {name} ({measurement_unit}) - {amount}'
+            for name, measurement_unit, amount in rows
+        ),
+        '',
+        f'Foodgram ({today:%Y})',
+    ]
+    y = height - 50
+    pdf.setFont(font, 12)
+    for text in lines:
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - 50
+        pdf.drawString(50, y, text)
+        y -= 18
+    pdf.save()
+    yield buffer.getvalue()
+
+
+CART_FORMATS = {
+    'txt': ('text/plain', render_txt),
+    'csv': ('text/csv', render_csv),
+}
+if canvas is not None:
+    CART_FORMATS['pdf'] = ('application/pdf', render_pdf)
+
+
+def cached_stream(key, chunks):
+    """ Отдавать части файла по мере готовности и сохранить результат """
+    parts = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(parts), settings.SHOPPING_CART_CACHE_TIMEOUT)
+
+
+def export_cart(user, file_type):
+    """ Файл списка покупок частями: из кэша или из сводной таблицы.
+
+    База выбирается сейчас, а не при чтении файла: он дочитывается уже
+    после ReplicaMiddleware, а свежая запись клиента должна быть видна.
+    """
+    today = date.today()
+    version = get_versions(get_cart_key(user.id))[0]
+    key = f'cart:{user.id}:{version}:{file_type}:{today}'
+    content = cache.get(key)
+    if content is not None:
+        return iter((content,))
+    _, render = CART_FORMATS[file_type]
+    rows = get_cart_rows(user, router.db_for_read(ShoppingCartIngredient))
+    return cached_stream(key, render(user, today, rows))
@@ -0,0 +1,204 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import Signal, receiver
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (FavoritesList, Follow, IngredientInRecipe,
+                            Ingredients, Recipe, ShoppingList, Tag)
+from recipes.signals import recipe_changing, recipe_saved
+from users.models import User
+
+from .authentication import token_cache
+from .cache import (bump_version, catalog_cache, get_user_key,
+                    get_viewer_key)
+from .conditional import (RECIPES_VERSION_KEY, USER_SHOWN_FIELDS,
+                          USERS_VERSION_KEY)
+from .counters import change_counter
+from .feed import backfill, fan_out, schedule_prune
+from .pantry import record_change
+from .ranking import marks_added, marks_removed
+from .search import delete_search_documents, update_search_documents
+from .shopping_cart import (add_recipe_to_carts, add_to_cart,
+                            remove_from_cart, remove_recipe_from_carts)
+from .similar import update_similar
+
+# Изменился состав рецептов recipe_ids; bulk — массовая загрузка
+ingredients_changed = Signal()
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+@receiver((post_save, post_delete), sender=Tag)
+def catalog_changed(**kwargs):
+    transaction.on_commit(catalog_cache.bump)
+
+
+@receiver((post_save, post_delete), sender=FavoritesList)
+@receiver((post_save, post_delete), sender=ShoppingList)
+@receiver((post_save, post_delete), sender=Follow)
+def viewer_state_changed(instance, **kwargs):
+    transaction.on_commit(
+        partial(bump_version, get_viewer_key(instance.user_id))
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_saving(instance, update_fields=None, **kwargs):
+    """ Запомнить, меняются ли поля пользователя, видные в ответах """
+    fields = [
+        field for field in USER_SHOWN_FIELDS
+        if update_fields is None or field in update_fields
+    ]
+    instance.shown_fields_changed = (
+        bool(fields) and not instance._state.adding
+        and User.objects.filter(pk=instance.pk).values_list(
+            *fields
+        ).first() != tuple(getattr(instance, field) for field in fields)
+    )
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(instance, signal, created=False, update_fields=None,
+                 **kwargs):
+    if signal is post_delete or getattr(
+        instance, 'shown_fields_changed', False
+    ):
+        transaction.on_commit(
+            partial(bump_version, get_user_key(instance.id))
+        )
+        # Автор виден в своих рецептах; рецепты удалённого удалятся сами
+        if signal is post_save and Recipe.objects.filter(
+            author_id=instance.id
+        ).exists():
+            transaction.on_commit(partial(bump_version, USERS_VERSION_KEY))
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    # Смена пароля, отключение и удаление пользователя отзывают токены
+    transaction.on_commit(partial(token_cache.revoke, instance.id))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    transaction.on_commit(partial(token_cache.revoke, instance.user_id))
+
+
+@receiver(post_save, sender=ShoppingList)
+def recipe_added_to_cart(instance, created, **kwargs):
+    if created:
+        add_to_cart(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def recipe_removed_from_cart(instance, **kwargs):
+    remove_from_cart([instance.user_id], [instance.recipe_id])
+
+
+def get_delta(signal, created):
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver((post_save, post_delete), sender=FavoritesList)
+def favorites_count_changed(instance, signal, created=False, **kwargs):
+    change_counter(Recipe, 'favorites_count', get_delta(signal, created),
+                   pk=instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def in_carts_count_changed(instance, signal, created=False, **kwargs):
+    change_counter(Recipe, 'in_carts_count', get_delta(signal, created),
+                   pk=instance.recipe_id)
+
+
+@receiver(post_save, sender=FavoritesList)
+@receiver(post_save, sender=ShoppingList)
+def recipe_marked(sender, instance, created, **kwargs):
+    if created:
+        marks_added(sender, [(instance.recipe_id, instance.scored)])
+
+
+@receiver(post_delete, sender=FavoritesList)
+@receiver(post_delete, sender=ShoppingList)
+def recipe_unmarked(sender, instance, **kwargs):
+    marks_removed(sender, [(instance.recipe_id, instance.scored)])
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(**kwargs):
+    transaction.on_commit(partial(bump_version, RECIPES_VERSION_KEY))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipes_count_changed(instance, signal, created=False, **kwargs):
+    change_counter(User, 'recipes_count', get_delta(signal, created),
+                   pk=instance.author_id)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def followers_count_changed(instance, signal, created=False, **kwargs):
+    change_counter(User, 'followers_count', get_delta(signal, created),
+                   pk=instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def author_followed(instance, created, **kwargs):
+    if created:
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def author_unfollowed(instance, **kwargs):
+    schedule_prune(instance.user_id)
+
+
+@receiver(post_save, sender=Ingredients)
+def ingredient_renamed(instance, created, **kwargs):
+    if not created:
+        update_search_documents(IngredientInRecipe.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    delete_search_documents([instance.id])
+    transaction.on_commit(partial(record_change, [instance.id]))
+
+
+@receiver(pre_delete, sender=Ingredients)
+def ingredient_deleted(instance, **kwargs):
+    recipe_ids = list(IngredientInRecipe.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True))
+    if recipe_ids:
+        transaction.on_commit(partial(record_change, recipe_ids))
+
+
+@receiver(ingredients_changed)
+def recipe_ingredients_changed(recipe_ids, bulk=False, **kwargs):
+    transaction.on_commit(partial(bump_version, RECIPES_VERSION_KEY))
+    transaction.on_commit(partial(record_change, list(recipe_ids)))
+    # После массовой загрузки похожие пересчитывает manage.py buildsimilar
+    if not bulk:
+        for recipe_id in recipe_ids:
+            transaction.on_commit(partial(update_similar, recipe_id))
+
+
+@receiver(recipe_changing, sender=Recipe)
+def admin_recipe_changing(recipe, **kwargs):
+    remove_recipe_from_carts(recipe.id)
+
+
+@receiver(recipe_saved, sender=Recipe)
+def admin_recipe_saved(recipe, created, **kwargs):
+    """ Сводные списки покупок, поиск, похожие и ленты после админки """
+    add_recipe_to_carts(recipe.id)
+    update_search_documents([recipe.id])
+    ingredients_changed.send(sender=Recipe, recipe_ids=[recipe.id])
+    if created:
+        fan_out(recipe)
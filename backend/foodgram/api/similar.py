@@ -0,0 +1,260 @@
+import multiprocessing
+from itertools import chain
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Exists, OuterRef
+
+from recipes.models import IngredientInRecipe, Recipe, SimilarRecipe
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+
+# Матрица для процессов пула: наследуется при fork, а не передаётся
+worker_matrix = None
+
+
+def load_pairs(queryset):
+    """ Пары (рецепт, ингредиент) массивом n×2 без списков кортежей """
+    pairs = np.fromiter(chain.from_iterable(
+        queryset.values_list('recipe_id', 'ingredient_id').iterator(
+            chunk_size=settings.SIMILAR_BATCH_SIZE * 10
+        )
+    ), dtype=np.int64)
+    return pairs.reshape(-1, 2)
+
+
+def make_matrix(pairs, frequencies=None, total=None):
+    """ Строки рецептов с весами IDF ингредиентов, нормированные по L2.
+
+    Без frequencies и total частоты считаются по самим парам. Слишком
+    частые ингредиенты (соль, вода) с долей больше SIMILAR_MAX_DF
+    не учитываются: они не отличают рецепты и делают произведение
+    матриц плотным.
+    """
+    recipes, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredients, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (rows.ravel(), columns.ravel())),
+        shape=(len(recipes), len(ingredients))
+    )
+    matrix.data[:] = 1
+    if frequencies is None:
+        frequencies = np.diff(matrix.tocsc().indptr)
+        total = len(recipes)
+    else:
+        frequencies = np.array([frequencies[pk] for pk in ingredients])
+    weights = np.log(total / frequencies)
+    weights[frequencies > settings.SIMILAR_MAX_DF * total] = 0
+    matrix = matrix @ sparse.diags(weights)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)))
+    norms = norms.ravel()
+    norms[norms == 0] = 1
+    return recipes, sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def get_top(columns, scores, exclude, size):
+    """ size лучших столбцов по убыванию сходства, без exclude """
+    keep = (columns != exclude) & (scores > 0)
+    columns, scores = columns[keep], scores[keep]
+    if len(scores) > size:
+        best = np.argpartition(-scores, size)[:size]
+        columns, scores = columns[best], scores[best]
+    order = np.lexsort((columns, -scores))
+    return columns[order], scores[order]
+
+
+def get_neighbours(matrix, start, stop):
+    """ Лучшие по косинусному сходству соседи строк start:stop """
+    products = matrix[start:stop] @ matrix.T
+    neighbours = []
+    for offset in range(stop - start):
+        begin, end = products.indptr[offset], products.indptr[offset + 1]
+        neighbours.append((start + offset, *get_top(
+            products.indices[begin:end], products.data[begin:end],
+            start + offset, settings.SIMILAR_RECIPES_TOP_K
+        )))
+    return neighbours
+
+
+def compute_batch(bounds):
+    return get_neighbours(worker_matrix, *bounds)
+
+
+def save_neighbours(recipes, neighbours):
+    """ Заменить похожие рецепты у рецептов пачки """
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=[
+            recipes[row] for row, _, _ in neighbours
+        ]).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(
+                recipe_id=recipes[row],
+                similar_id=recipes[column],
+                score=float(score),
+            )
+            for row, columns, scores in neighbours
+            for column, score in zip(columns, scores)
+        )
+
+
+def rebuild_similar(workers=1, progress=None):
+    """ Пересчитать похожие рецепты для всех рецептов.
+
+    Строки матрицы делятся на пачки по SIMILAR_BATCH_SIZE, пачки
+    считаются в пуле из workers процессов, результаты пишет основной
+    процесс. Возвращает число рецептов.
+    """
+    global worker_matrix
+    recipes, worker_matrix = make_matrix(
+        load_pairs(IngredientInRecipe.objects.all())
+    )
+    recipes = recipes.tolist()
+    size = settings.SIMILAR_BATCH_SIZE
+    batches = [
+        (start, min(start + size, len(recipes)))
+        for start in range(0, len(recipes), size)
+    ]
+    if workers > 1:
+        # Соединения с базой не должны достаться дочерним процессам
+        connections.close_all()
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        results = pool.imap(compute_batch, batches)
+    else:
+        pool, results = None, map(compute_batch, batches)
+    try:
+        for (_, stop), neighbours in zip(batches, results):
+            save_neighbours(recipes, neighbours)
+            if progress:
+                progress(stop, len(recipes))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        worker_matrix = None
+    SimilarRecipe.objects.exclude(Exists(IngredientInRecipe.objects.filter(
+        recipe_id=OuterRef('recipe_id')
+    ))).delete()
+    return len(recipes)
+
+
+def get_frequencies(ingredient_ids):
+    """ Число рецептов с каждым из ингредиентов """
+    return dict(IngredientInRecipe.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).values('ingredient_id').annotate(
+        recipes=Count('recipe_id', distinct=True)
+    ).values_list('ingredient_id', 'recipes'))
+
+
+def get_candidates(recipe_id, ingredient_ids):
+    """ Рецепты с наибольшим числом общих ингредиентов из ingredient_ids.
+
+    Частые ингредиенты сюда не передаются: их строки — большая часть
+    таблицы, а на сходство они не влияют.
+    """
+    return list(IngredientInRecipe.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).exclude(recipe_id=recipe_id).values('recipe_id').annotate(
+        overlap=Count('id')
+    ).order_by('-overlap', 'recipe_id').values_list(
+        'recipe_id', flat=True
+    )[:settings.SIMILAR_CANDIDATES])
+
+
+def add_to_neighbours(recipe_id, scores):
+    """ Поставить рецепт в списки кандидатов, где он входит в лучшие """
+    size = settings.SIMILAR_RECIPES_TOP_K
+    current = {}
+    for row in SimilarRecipe.objects.filter(
+        recipe_id__in=scores
+    ).values('id', 'recipe_id', 'score'):
+        current.setdefault(row['recipe_id'], []).append(row)
+    added, removed = [], []
+    for candidate, score in scores.items():
+        rows = sorted(
+            current.get(candidate, []), key=lambda row: -row['score']
+        )
+        if len(rows) >= size and score <= rows[size - 1]['score']:
+            continue
+        added.append(SimilarRecipe(
+            recipe_id=candidate, similar_id=recipe_id, score=score
+        ))
+        removed += [row['id'] for row in rows[size - 1:]]
+    SimilarRecipe.objects.filter(id__in=removed).delete()
+    SimilarRecipe.objects.bulk_create(added)
+
+
+def get_scores(recipe_id):
+    """ {похожий рецепт: сходство} по убыванию сходства.
+
+    Сравнение идёт только с SIMILAR_CANDIDATES рецептами с общими
+    ингредиентами, кроме частых (доля больше SIMILAR_MAX_DF); частоты
+    берутся по всей базе.
+    """
+    own = IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', flat=True)
+    frequencies = get_frequencies(own)
+    total = Recipe.objects.count()
+    candidates = get_candidates(recipe_id, [
+        pk for pk, count in frequencies.items()
+        if count <= settings.SIMILAR_MAX_DF * total
+    ])
+    if not candidates:
+        return {}
+    pairs = load_pairs(IngredientInRecipe.objects.filter(
+        recipe_id__in=[recipe_id, *candidates]
+    ))
+    frequencies.update(get_frequencies(
+        set(pairs[:, 1].tolist()) - frequencies.keys()
+    ))
+    recipes, matrix = make_matrix(pairs, frequencies, total)
+    row = int(np.searchsorted(recipes, recipe_id))
+    products = (matrix @ matrix[row].T).toarray().ravel()
+    columns, scores = get_top(
+        np.arange(len(recipes)), products, row, len(recipes)
+    )
+    return {
+        int(recipes[column]): float(score)
+        for column, score in zip(columns, scores)
+    }
+
+
+def save_top(recipe_id, scores):
+    """ Заменить похожие рецепта лучшими SIMILAR_RECIPES_TOP_K из scores """
+    SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=recipe_id, similar_id=pk, score=score)
+        for pk, score in list(scores.items())[
+            :settings.SIMILAR_RECIPES_TOP_K
+        ]
+    )
+
+
+@transaction.atomic
+def update_similar(recipe_id):
+    """ Пересчитать похожие после изменения ингредиентов рецепта.
+
+    Рецепт обновляется и в списках соседей, а соседи, из списков
+    которых он выпал, пересчитываются целиком. Сходство остальных пар
+    зависит от частот ингредиентов по всей базе и здесь не меняется:
+    manage.py buildsimilar стоит запускать по расписанию.
+    """
+    if np is None:
+        return
+    former = set(SimilarRecipe.objects.filter(
+        similar_id=recipe_id
+    ).values_list('recipe_id', flat=True))
+    SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+    scores = get_scores(recipe_id)
+    save_top(recipe_id, scores)
+    add_to_neighbours(recipe_id, scores)
+    kept = set(SimilarRecipe.objects.filter(
+        similar_id=recipe_id, recipe_id__in=former
+    ).values_list('recipe_id', flat=True))
+    for neighbour in former - kept:
+        save_top(neighbour, get_scores(neighbour))
@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
-
-from .views import (IngredientsViewSet, RecipeViewSet,
-                    TagViewSet, UsersViewSet)
+from . import async_views
+from .views import (IngredientsViewSet, RecipeViewSet, TagViewSet,
+                    TokenCacheStatsView, UsersViewSet)
 
 app_name = 'api'
 
@@ -16,7 +17,17 @@ router.register(r'users', UsersViewSet, basename='users')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('auth/token-cache/', TokenCacheStatsView.as_view()),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include('djoser.urls')),
 
 ]
+
+if settings.ASYNC_READS:
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        path('ingredients/', async_views.ingredient_list),
+        path('users/subscriptions/', async_views.subscriptions),
+    ] + urlpatterns
@@ -0,0 +1,57 @@
+from django.conf import settings
+
+from recipes.models import FavoritesList, Follow, ShoppingList
+
+VIEWER_SETS = {
+    'following': (Follow, 'author_id'),
+    'favorites': (FavoritesList, 'recipe_id'),
+    'shopping_cart': (ShoppingList, 'recipe_id'),
+}
+
+
+class Viewer:
+    """ Подписки, избранное и корзина пользователя на время запроса.
+
+    Каждый набор id загружается одним запросом при первом обращении.
+    Если набор больше VIEWER_SET_LIMIT, проверки идут запросом к базе.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.sets = {}
+
+    def get_set(self, name):
+        if name not in self.sets:
+            model, field = VIEWER_SETS[name]
+            limit = settings.VIEWER_SET_LIMIT
+            ids = set(model.objects.filter(user=self.user).values_list(
+                field, flat=True
+            )[:limit + 1])
+            self.sets[name] = ids if len(ids) <= limit else None
+        return self.sets[name]
+
+    def contains(self, name, pk):
+        if self.user.is_anonymous:
+            return False
+        ids = self.get_set(name)
+        if ids is not None:
+            return pk in ids
+        model, field = VIEWER_SETS[name]
+        return model.objects.filter(user=self.user, **{field: pk}).exists()
+
+    def is_subscribed(self, author_id):
+        return self.contains('following', author_id)
+
+    def is_favorited(self, recipe_id):
+        return self.contains('favorites', recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return self.contains('shopping_cart', recipe_id)
+
+
+def get_viewer(request):
+    """ Viewer текущего запроса, создаётся один раз """
+    viewer = getattr(request, 'viewer', None)
+    if viewer is None:
+        viewer = request.viewer = Viewer(request.user)
+    return viewer
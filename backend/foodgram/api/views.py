@@ -1,44 +1,95 @@
-from datetime import datetime
 from django_filters.rest_framework import DjangoFilterBackend
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import (Exists, F, OuterRef, Prefetch, Value, Window,
+                              prefetch_related_objects)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from djoser.views import UserViewSet
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
+from rest_framework.views import APIView
 
 from users.models import User
 from recipes.models import (FavoritesList, Ingredients, IngredientInRecipe,
                             Recipe, ShoppingList, Tag, Follow
                             )
 
-from .filters import IngredientFilter, RecipeFilter
+from .authentication import token_cache
+from .cache import catalog_cache
+from .conditional import (catalog_validators, conditional,
+                          recipe_list_validators, recipe_validators,
+                          user_validators)
+from .feed import get_feed_page
+from .marks import CREATED, NOT_FOUND, add_marks, remove_marks
+from .filters import RecipeFilter
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .pagination import CatsPagination
-from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          ShoppingListSerializer, TagSerializer,
-                          FollowSerializer, CustomUserSerializer)
+from .pagination import (CatsPagination, EstimatedList, FeedPagination,
+                         ListPagination)
+from .pantry import pantry_index
+from .ranking import ORDERINGS
+from .renderers import FastJSONRenderer
+from .search import ingredient_index
+from .serializers import (CreateRecipeSerializer, IngredientSerializer,
+                          PantryRecipeSerializer, PantrySerializer,
+                          RecipeIdsSerializer, RecipeListSerializer,
+                          RecipeSerializer, RecipeShortInfo,
+                          TagSerializer, FollowSerializer,
+                          CustomUserSerializer)
+from .shopping_cart import CART_FORMATS, export_cart
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogViewSet(viewsets.ReadOnlyModelViewSet):
+    """ Справочник, список которого отдаётся готовым JSON из кэша """
+    catalog_name = None
+
+    def render_catalog(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return FastJSONRenderer().render(serializer.data)
+
+    def search(self, request):
+        """ Ответ на запрос с параметрами поиска или None — весь список """
+        return None
+
+    @conditional(catalog_validators)
+    def list(self, request, *args, **kwargs):
+        response = self.search(request)
+        if response is not None:
+            return response
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return HttpResponse(
+            catalog_cache.get(self.catalog_name, self.render_catalog),
+            content_type='application/json'
+        )
+
+
+class TagViewSet(CatalogViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    catalog_name = 'tags'
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(CatalogViewSet):
     """Получить список всех категорий"""
     queryset = Ingredients.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
-    filter_backends = (IngredientFilter,)
-    search_fields = ('name',)
+    catalog_name = 'ingredients'
+
+    def search(self, request):
+        name = request.query_params.get('name')
+        if name is None:
+            return None
+        return Response(ingredient_index.search(name))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -49,33 +100,101 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def keyset_ordering(self):
+        """ Курсор ?cursor= по сортировке из ?ordering= """
+        return ORDERINGS.get(
+            self.request.query_params.get('ordering'), ('-pub_date', '-id')
+        )
+
+    def get_queryset(self):
+        """ Рецепты с флагами пользователя и связанными данными """
+        user = self.request.user
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'ingredientinrecipe_set',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(FavoritesList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
     def get_serializer_class(self):
+        if self.action in ('list', 'feed', 'similar'):
+            return RecipeListSerializer
+        if self.action == 'pantry':
+            return PantryRecipeSerializer
         if self.request.method == 'GET':
             return RecipeSerializer
         return CreateRecipeSerializer
 
-    @staticmethod
-    def post_method_for_actions(request, pk, serializers):
-        """ Метод добавления """
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = serializers(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @conditional(recipe_list_validators)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(recipe_validators)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     @staticmethod
-    def delete_method_for_actions(request, pk, model):
+    def get_recipe_id(pk):
+        try:
+            return int(pk)
+        except ValueError:
+            raise Http404
+
+    def post_method_for_actions(self, request, pk, model):
+        """ Метод добавления: повторное добавление не ошибка """
+        pk = self.get_recipe_id(pk)
+        result = add_marks(model, request.user.id, [pk])[pk]
+        if result == NOT_FOUND:
+            raise Http404
+        recipe = Recipe.objects.get(pk=pk)
+        return Response(
+            RecipeShortInfo(recipe, context={'request': request}).data,
+            status=(
+                status.HTTP_201_CREATED if result == CREATED
+                else status.HTTP_200_OK
+            )
+        )
+
+    def delete_method_for_actions(self, request, pk, model):
         """ Метод удаления """
-        obj = model.objects.filter(user=request.user, recipe__id=pk)
-        obj.delete()
+        remove_marks(model, request.user.id, [self.get_recipe_id(pk)])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def batch_method_for_actions(request, model):
+        """ Добавить или удалить несколько рецептов одним запросом """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = add_marks if request.method == 'POST' else remove_marks
+        result = change(
+            model, request.user.id, serializer.validated_data['ids']
+        )
+        return Response([
+            {'id': pk, 'status': value} for pk, value in result.items()
+        ])
+
     @action(detail=True, methods=['post'])
     def shopping_cart(self, request, pk):
         """ Добавить в список покупок """
         return self.post_method_for_actions(
-            request, pk, serializers=ShoppingListSerializer
-        )
+            request=request, pk=pk, model=ShoppingList)
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
@@ -83,11 +202,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.delete_method_for_actions(
             request=request, pk=pk, model=ShoppingList)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request):
+        """ Добавить в список покупок или удалить из него {"ids": [...]} """
+        return self.batch_method_for_actions(request, ShoppingList)
+
     @action(detail=True, methods=['post'])
     def favorite(self, request, pk):
         """ Добавить в избранное """
         return self.post_method_for_actions(
-            request=request, pk=pk, serializers=FavoriteSerializer)
+            request=request, pk=pk, model=FavoritesList)
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
@@ -95,37 +225,124 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.delete_method_for_actions(
             request=request, pk=pk, model=FavoritesList)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_batch(self, request):
+        """ Добавить в избранное или удалить из него {"ids": [...]} """
+        return self.batch_method_for_actions(request, FavoritesList)
+
+    def get_pantry_params(self):
+        query_params = self.request.query_params
+        data = {'ingredients': [
+            pk for value in query_params.getlist('ingredients')
+            for pk in value.split(',') if pk
+        ]}
+        if 'missing' in query_params:
+            data['missing'] = query_params['missing']
+        params = PantrySerializer(data=data)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def filter_pantry(self, found, needed):
+        """ Отфильтровать найденное пачками, пока не наберётся needed.
+
+        Список id в запросе не больше PANTRY_FILTER_BATCH_SIZE. Если
+        просмотрено не всё, общее число оценивается по доле прошедших
+        фильтры в просмотренных пачках.
+        """
+        allowed, checked = [], 0
+        size = settings.PANTRY_FILTER_BATCH_SIZE
+        while checked < len(found) and len(allowed) < needed:
+            batch = found[checked:checked + size]
+            ids = set(self.filter_queryset(Recipe.objects.filter(
+                id__in=[pk for _, pk in batch]
+            )).values_list('id', flat=True))
+            allowed += [item for item in batch if item[1] in ids]
+            checked += len(batch)
+        if not checked:
+            return allowed
+        return EstimatedList(allowed, len(allowed) * len(found) // checked)
+
+    @action(detail=False, methods=['get'])
+    def pantry(self, request):
+        """ Что приготовить из продуктов ?ingredients=1,2&missing=1.
+
+        Сначала рецепты, где не хватает меньше ингредиентов. Фильтры
+        RecipeFilter (теги, автор и другие) применяются к найденному
+        до конца запрошенной страницы; count тогда приблизительный.
+        """
+        params = self.get_pantry_params()
+        found = pantry_index.search(
+            params['ingredients'], params['missing']
+        )
+        paginator = ListPagination()
+        if set(request.query_params) & set(self.filterset_class.base_filters):
+            try:
+                needed = paginator.get_page_size(request) * int(
+                    request.query_params.get(paginator.page_query_param, 1)
+                ) + 1
+            except ValueError:
+                needed = len(found)
+            found = self.filter_pantry(found, needed)
+        page = paginator.paginate_queryset(found, request, self)
+        recipes = self.get_queryset().in_bulk([pk for _, pk in page])
+        for missing, pk in page:
+            if pk in recipes:
+                recipes[pk].missing = missing
+        serializer = self.get_serializer([
+            recipes[pk] for _, pk in page if pk in recipes
+        ], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk):
+        """ Похожие рецепты по общим ингредиентам """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        recipes = self.get_queryset().filter(
+            similar_to__recipe=recipe
+        ).order_by('-similar_to__score', 'id')
+        return Response(self.get_serializer(recipes, many=True).data)
+
+    @action(
+        detail=False, methods=['get'], permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """ Новые рецепты авторов из подписок """
+        paginator = FeedPagination()
+        recipes = paginator.paginate_feed(
+            self.get_queryset(), request,
+            lambda position, size: get_feed_page(
+                request.user, position, size
+            )
+        )
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=False, methods=['get'], permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        """ Скачать рецепт """
+        """ Скачать список покупок в формате ?type=txt|csv|pdf """
         user = request.user
+        file_type = request.query_params.get('type', 'txt')
+        if file_type not in CART_FORMATS:
+            return Response(
+                {'errors': f'Доступные форматы: {", ".join(CART_FORMATS)}'},
+                status=HTTP_400_BAD_REQUEST
+            )
         if not user.shopping_list.exists():
             return Response(status=HTTP_400_BAD_REQUEST)
 
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_list__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-
-        today = datetime.today()
-        shopping_list = (
-            f'Список покупок для: {user.get_full_name()}\n\n'
-            f'Дата: {today:%Y-%m-%d}\n\n'
+        content_type, _ = CART_FORMATS[file_type]
+        response = StreamingHttpResponse(
+            export_cart(user, file_type), content_type=content_type
         )
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]}'
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        shopping_list += f'\n\nFoodgram ({today:%Y})'
-
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        filename = f'{user.username}_shopping_list.{file_type}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
@@ -133,9 +350,57 @@ class RecipeViewSet(viewsets.ModelViewSet):
 class UsersViewSet(UserViewSet):
     """ Отображение подписок """
     pagination_class = CatsPagination
+    keyset_ordering = ('-id',)
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
 
+    @conditional(user_validators)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_recipes_limit(self):
+        limit = self.request.query_params.get(
+            'recipes_limit', settings.RECIPES_LIMIT
+        )
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            limit = -1
+        if limit < 0:
+            raise ValidationError({
+                'recipes_limit': 'Укажите неотрицательное целое число.'
+            })
+        return limit
+
+    def get_subscriptions(self):
+        return User.objects.filter(
+            subscribing__user=self.request.user
+        ).annotate(is_subscribed=Value(True))
+
+    def serialize_subscriptions(self, authors):
+        """ Последние рецепты всех авторов страницы одним запросом """
+        limit = self.get_recipes_limit()
+        if not authors:
+            return []
+        ranked, params = Recipe.objects.filter(
+            author_id__in=[author.id for author in authors]
+        ).annotate(position=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )).values('id', 'position').query.sql_with_params()
+        prefetch_related_objects(authors, Prefetch(
+            'recipes',
+            queryset=Recipe.objects.filter(id__in=RawSQL(
+                f'SELECT id FROM ({ranked}) ranked WHERE position <= %s',
+                (*params, limit)
+            )).order_by('-pub_date', '-id'),
+            to_attr='limited_recipes'
+        ))
+        return FollowSerializer(
+            authors, many=True, context={'request': self.request}
+        ).data
+
     @action(
         url_name='subscribe',
         url_path='subscribe',
@@ -146,13 +411,13 @@ class UsersViewSet(UserViewSet):
         author = get_object_or_404(User, pk=id)
         user = request.user
         if request.method == 'POST':
+            self.get_recipes_limit()
             Follow.objects.create(user=user, author=author)
-            queryset = User.objects.filter(subscribing__user=user)
-            pages = self.paginate_queryset(queryset)
-            serializer = FollowSerializer(pages,
-                                          many=True,
-                                          context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            pages = self.paginate_queryset(self.get_subscriptions())
+            return Response(
+                self.serialize_subscriptions(pages),
+                status=status.HTTP_201_CREATED
+            )
 
         if request.method == 'DELETE':
             subscription = get_object_or_404(Follow,
@@ -164,12 +429,15 @@ class UsersViewSet(UserViewSet):
     @action(methods=['get'], detail=False)
     def subscriptions(self, request):
         """ Отоброжение подписок """
-        subscriptions_list = self.paginate_queryset(
-            User.objects.filter(subscribing__user=request.user)
-        )
-        serializer = FollowSerializer(
-            subscriptions_list, many=True, context={
-                'request': request
-            }
+        subscriptions_list = self.paginate_queryset(self.get_subscriptions())
+        return self.get_paginated_response(
+            self.serialize_subscriptions(subscriptions_list)
         )
-        return self.get_paginated_response(serializer.data)
+
+
+class TokenCacheStatsView(APIView):
+    """ Попадания и промахи кэша токенов в этом процессе """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(token_cache.get_stats())
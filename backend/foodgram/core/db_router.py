@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Отставание реплики PostgreSQL в секундах; 0, если всё применено
+LAG_SQL = '''
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+read_database = ContextVar('read_database', default=DEFAULT_DB_ALIAS)
+
+
+class ReplicaHealth:
+    """ Доступность и отставание реплик.
+
+    Каждая реплика проверяется не чаще раза в REPLICA_CHECK_INTERVAL
+    секунд; недоступная или отставшая больше REPLICA_MAX_LAG исключается
+    до следующей проверки, и чтение идёт с основной базы.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor != 'postgresql':
+                    cursor.execute('SELECT 1')
+                    return True
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            connection.close()
+            return False
+        return lag is None or lag <= settings.REPLICA_MAX_LAG
+
+    def is_healthy(self, alias):
+        checked_at, healthy = self.checked.get(alias, (None, False))
+        now = time.monotonic()
+        if checked_at is None or (
+            now - checked_at >= settings.REPLICA_CHECK_INTERVAL
+        ):
+            with self.lock:
+                healthy = self.check(alias)
+                self.checked[alias] = (now, healthy)
+        return healthy
+
+
+replica_health = ReplicaHealth()
+
+
+def get_pin_key(request):
+    """ Клиент по токену или сессии, без обращения к базе """
+    credentials = request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if credentials:
+        return f'db:pin:{md5(credentials.encode()).hexdigest()}'
+    return None
+
+
+def pin_to_primary(request):
+    """ После записи клиент читает с основной базы REPLICA_PIN_SECONDS """
+    key = get_pin_key(request)
+    if key is not None:
+        cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+
+
+def choose_read_database(request):
+    if request.method not in SAFE_METHODS:
+        return DEFAULT_DB_ALIAS
+    key = get_pin_key(request)
+    if key is not None and cache.get(key):
+        return DEFAULT_DB_ALIAS
+    replicas = [
+        alias for alias in settings.REPLICA_DATABASES
+        if replica_health.is_healthy(alias)
+    ]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """ Чтение — с базы, выбранной для запроса, запись — в основную """
+
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,209 @@
+import csv
+import io
+import json
+import re
+from collections import Counter
+
+from django.db import connection
+
+from api.counters import change_counter
+from api.feed import fan_out_recipes
+from api.search import update_search_documents
+from api.signals import ingredients_changed
+from recipes.models import IngredientInRecipe, Ingredients, Recipe, Tag
+from users.models import User
+
+CSV_COLUMNS = {
+    'ingredients': ('name', 'measurement_unit'),
+    'tags': ('name', 'color', 'slug'),
+}
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATOR = re.compile(r'[\s,]*')
+
+COPY_INGREDIENTS_SQL = '''
+    CREATE TEMP TABLE import_ingredients (
+        name text, measurement_unit text
+    ) ON COMMIT DROP;
+'''
+INSERT_COPIED_SQL = '''
+    INSERT INTO {table} (name, measurement_unit)
+    SELECT name, measurement_unit FROM import_ingredients
+    ON CONFLICT (name, measurement_unit) DO NOTHING
+'''
+UPSERT_TAGS_SQL = '''
+    INSERT INTO {table} (name, color, slug) VALUES {values}
+    ON CONFLICT (slug)
+    DO UPDATE SET name = excluded.name, color = excluded.color
+'''
+
+
+def read_csv(file, model):
+    """ Строки CSV без заголовка или с заголовком из имён полей """
+    columns = CSV_COLUMNS[model]
+    for number, row in enumerate(csv.reader(file)):
+        if row and not (number == 0 and tuple(row) == columns):
+            yield dict(zip(columns, row))
+
+
+def read_ndjson(file, model):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_json(file, model):
+    """ Элементы JSON-массива по одному, файл читается частями """
+    decoder = json.JSONDecoder()
+    buffer, position, opened, eof = '', 0, False, False
+    while True:
+        position = JSON_SEPARATOR.match(buffer, position).end()
+        if not opened and position < len(buffer):
+            if buffer[position] != '[':
+                raise ValueError('Ожидался JSON-массив')
+            opened, position = True, position + 1
+            continue
+        if opened and buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise ValueError('JSON-массив не закончен')
+            chunk = file.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'ndjson': read_ndjson,
+}
+
+
+def copy_ingredients(ingredients):
+    """ PostgreSQL: COPY во временную таблицу и вставка без повторов """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(ingredients)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(COPY_INGREDIENTS_SQL)
+        cursor.copy_expert(
+            'COPY import_ingredients FROM STDIN WITH (FORMAT csv)', buffer
+        )
+        cursor.execute(INSERT_COPIED_SQL.format(
+            table=Ingredients._meta.db_table
+        ))
+
+
+def load_ingredients(rows):
+    ingredients = {
+        (row['name'].strip(), row['measurement_unit'].strip())
+        for row in rows
+    }
+    if connection.vendor == 'postgresql':
+        copy_ingredients(ingredients)
+        return
+    Ingredients.objects.bulk_create([
+        Ingredients(name=name, measurement_unit=measurement_unit)
+        for name, measurement_unit in ingredients
+    ], ignore_conflicts=True)
+
+
+def load_tags(rows):
+    tags = {
+        row['slug']: (row['name'], row['color'], row['slug'])
+        for row in rows
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_TAGS_SQL.format(
+            table=Tag._meta.db_table,
+            values=', '.join(['(%s, %s, %s)'] * len(tags)),
+        ), [value for tag in tags.values() for value in tag])
+
+
+def resolve(mapping, key, label):
+    if key not in mapping:
+        raise ValueError(f'{label} не найден: {key}')
+    return mapping[key]
+
+
+def load_recipes(rows):
+    """ Рецепты с ключом (автор, название); существующие пропускаются """
+    authors = dict(User.objects.filter(
+        username__in={row['author'] for row in rows}
+    ).values_list('username', 'id'))
+    tags = dict(Tag.objects.filter(
+        slug__in={slug for row in rows for slug in row.get('tags', ())}
+    ).values_list('slug', 'id'))
+    ingredients = {
+        (name, measurement_unit): pk
+        for pk, name, measurement_unit in Ingredients.objects.filter(
+            name__in={
+                item['name'] for row in rows for item in row['ingredients']
+            }
+        ).values_list('id', 'name', 'measurement_unit')
+    }
+    recipes = {}
+    for row in rows:
+        author_id = resolve(authors, row['author'], 'Автор')
+        recipes.setdefault((author_id, row['name']), row)
+    existing = Recipe.objects.filter(
+        author_id__in={author_id for author_id, _ in recipes},
+        name__in={name for _, name in recipes},
+    )
+    for key in existing.values_list('author_id', 'name'):
+        recipes.pop(key, None)
+    Recipe.objects.bulk_create([
+        Recipe(
+            author_id=author_id,
+            name=name,
+            text=row['text'],
+            cooking_time=row['cooking_time'],
+            image=row.get('image', ''),
+        ) for (author_id, name), row in recipes.items()
+    ])
+    ids = {
+        (author_id, name): pk
+        for pk, author_id, name in existing.values_list(
+            'id', 'author_id', 'name'
+        ) if (author_id, name) in recipes
+    }
+    amounts = Counter()
+    for key, row in recipes.items():
+        for item in row['ingredients']:
+            amounts[ids[key], resolve(
+                ingredients,
+                (item['name'], item['measurement_unit']),
+                'Ингредиент'
+            )] += int(item['amount'])
+    IngredientInRecipe.objects.bulk_create([
+        IngredientInRecipe(
+            recipe_id=recipe_id, ingredient_id=ingredient_id, amount=amount
+        ) for (recipe_id, ingredient_id), amount in amounts.items()
+    ])
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(
+            recipe_id=ids[key], tag_id=resolve(tags, slug, 'Тег')
+        ) for key, row in recipes.items() for slug in set(row.get('tags', ()))
+    ])
+    for author_id, count in Counter(
+        author_id for author_id, _ in recipes
+    ).items():
+        change_counter(User, 'recipes_count', count, id=author_id)
+    update_search_documents(ids.values())
+    ingredients_changed.send(
+        sender=Recipe, recipe_ids=list(ids.values()), bulk=True
+    )
+    fan_out_recipes(Recipe.objects.filter(id__in=ids.values()).values_list(
+        'id', 'author_id', 'pub_date'
+    ))
+
+
+LOADERS = {
+    'ingredients': load_ingredients,
+    'tags': load_tags,
+    'recipes': load_recipes,
+}
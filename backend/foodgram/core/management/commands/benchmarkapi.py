@@ -0,0 +1,156 @@
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Follow, Ingredients, Recipe, ShoppingList, Tag
+
+
+class Command(BaseCommand):
+    help = 'Замер задержки и числа запросов к базе для эндпоинтов api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Число запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='*', default=(),
+                            help='Запустить только указанные сценарии')
+        parser.add_argument('--save', metavar='NAME',
+                            help='Сохранить результат как базовый')
+        parser.add_argument('--compare', metavar='NAME',
+                            help='Сравнить с сохранённым результатом')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть не меньше 1')
+        user_id = (
+            ShoppingList.objects.values_list('user_id', flat=True).first()
+            or Follow.objects.values_list('user_id', flat=True).first()
+        )
+        if user_id is None:
+            raise CommandError(
+                'Нет данных для замеров: manage.py generatedata'
+            )
+        token, _ = Token.objects.get_or_create(user_id=user_id)
+        client = Client(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+        results = {}
+        for name, url in self.get_scenarios():
+            if options['only'] and name not in options['only']:
+                continue
+            results[name] = self.run_scenario(
+                client, url, options['requests'], options['warmup']
+            )
+            self.report(name, results[name])
+
+        if options['compare']:
+            self.compare(self.load(options['compare']), results)
+        if options['save']:
+            path = self.get_path(options['save'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(f'Сохранено в {path}')
+
+    def get_scenarios(self):
+        recipe = Recipe.objects.values_list('id', flat=True).first()
+        tags = Tag.objects.values_list('slug', flat=True)[:2]
+        ingredient = Ingredients.objects.values_list(
+            'name', flat=True
+        ).first()
+        author = Recipe.objects.values_list('author_id', flat=True).first()
+        tags_query = '&'.join(f'tags={slug}' for slug in tags)
+        return (
+            ('recipes', '/api/recipes/'),
+            ('recipes_limit_50', '/api/recipes/?limit=50'),
+            ('recipes_deep_page', '/api/recipes/?page=50'),
+            ('recipe_detail', f'/api/recipes/{recipe}/'),
+            ('recipes_by_tags', f'/api/recipes/?{tags_query}'),
+            ('recipes_by_author', f'/api/recipes/?author={author}'),
+            ('recipes_favorited', '/api/recipes/?is_favorited=1'),
+            ('recipes_in_cart', '/api/recipes/?is_in_shopping_cart=1'),
+            ('subscriptions', '/api/users/subscriptions/'),
+            ('users', '/api/users/'),
+            ('tags', '/api/tags/'),
+            ('ingredients', '/api/ingredients/'),
+            ('ingredient_search', f'/api/ingredients/?name={ingredient[:3]}'),
+            ('download_shopping_cart',
+             '/api/recipes/download_shopping_cart/'),
+        )
+
+    def run_scenario(self, client, url, requests, warmup):
+        for _ in range(warmup):
+            client.get(url)
+        timings = []
+        queries = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context))
+        elapsed = time.perf_counter() - started
+        if len(timings) > 1:
+            percentiles = statistics.quantiles(
+                timings, n=100, method='inclusive'
+            )
+        else:
+            # Один замер: он же и все перцентили
+            percentiles = timings * 99
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'queries': max(queries),
+            'rps': round(requests / elapsed, 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<24} {result["status"]} '
+            f'p50 {result["p50_ms"]:>9.2f} ms  '
+            f'p95 {result["p95_ms"]:>9.2f} ms  '
+            f'p99 {result["p99_ms"]:>9.2f} ms  '
+            f'{result["queries"]:>4} запросов  {result["rps"]:>8.1f} rps'
+        )
+
+    def compare(self, baseline, results):
+        self.stdout.write('\nСравнение с базовым результатом:')
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            self.stdout.write(
+                f'{name:<24} '
+                f'p50 {self.delta(before["p50_ms"], result["p50_ms"])}  '
+                f'p95 {self.delta(before["p95_ms"], result["p95_ms"])}  '
+                f'запросов {before["queries"]} -> {result["queries"]}'
+            )
+
+    @staticmethod
+    def delta(before, after):
+        if not before:
+            return f'{after:.2f} ms'
+        return f'{after:.2f} ms ({(after - before) / before:+.0%})'
+
+    def get_path(self, name):
+        return Path(settings.BENCHMARK_DIR) / f'{name}.json'
+
+    def load(self, name):
+        path = self.get_path(name)
+        if not path.exists():
+            raise CommandError(f'Нет сохранённого результата {path}')
+        return json.loads(path.read_text())
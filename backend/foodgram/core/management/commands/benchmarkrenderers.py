@@ -0,0 +1,75 @@
+import io
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.renderers import (FastJSONParser, FastJSONRenderer,
+                           MessagePackParser, MessagePackRenderer, msgpack)
+from api.serializers import RecipeSerializer
+from api.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    help = 'Сравнение рендереров и парсеров на страницах рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=50,
+                            help='Рецептов на странице')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        data = self.get_payload(options['recipes'])
+        if not data:
+            raise CommandError(
+                'Нет данных для замеров: manage.py generatedata'
+            )
+        pairs = [
+            ('drf-json', JSONRenderer(), JSONParser()),
+            ('fast-json', FastJSONRenderer(), FastJSONParser()),
+        ]
+        if msgpack is not None:
+            pairs.append(
+                ('msgpack', MessagePackRenderer(), MessagePackParser())
+            )
+        baseline = JSONRenderer().render(data)
+        for name, renderer, parser in pairs:
+            content = renderer.render(data)
+            if renderer.format == 'json' and content != baseline:
+                self.stderr.write(f'{name}: ответ отличается от JSONRenderer')
+            render_ms = self.measure(
+                lambda: renderer.render(data), options['repeat']
+            )
+            parse_ms = self.measure(
+                lambda: parser.parse(io.BytesIO(content)), options['repeat']
+            )
+            self.stdout.write(
+                f'{name:<10} {len(content):>9} байт  '
+                f'render p50 {render_ms:>8.3f} ms  '
+                f'parse p50 {parse_ms:>8.3f} ms'
+            )
+
+    def get_payload(self, size):
+        """ Страница рецептов так, как её сериализует RecipeViewSet """
+        request = Request(
+            RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0]).get('/')
+        )
+        view = RecipeViewSet(request=request, format_kwarg=None)
+        recipes = view.get_queryset().order_by('-pub_date')[:size]
+        return RecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+
+    @staticmethod
+    def measure(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
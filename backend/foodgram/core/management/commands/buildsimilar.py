@@ -0,0 +1,33 @@
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from api.similar import np, rebuild_similar
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт похожих рецептов по общим ингредиентам; запускать по '
+        'расписанию, например раз в сутки: изменения рецептов обновляют '
+        'только их соседей, а частоты ингредиентов сдвигаются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов для расчёта')
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('Нужны numpy и scipy: pip install numpy scipy')
+        started = time.monotonic()
+        total = rebuild_similar(
+            workers=options['workers'], progress=self.report
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны для {total} рецептов '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def report(self, done, total):
+        self.stdout.write(f'Обработано {done} из {total} рецептов')
@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.request import Request
+
+from api.serializers import RecipeListSerializer, RecipeSerializer
+from api.views import RecipeViewSet
+from recipes.models import IngredientInRecipe, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка быстрого вывода рецептов с обычным выводом DRF '
+        'для объектов с prefetch и словарей из .values()'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='id пользователя для флагов избранного')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        request = self.get_request(options['user'])
+        view = RecipeViewSet(request=request, format_kwarg=None)
+        queryset = view.get_queryset().order_by('id')
+        checked = mismatched = 0
+        batch_size = options['batch_size']
+        for start in range(0, queryset.count(), batch_size):
+            recipes = list(queryset[start:start + batch_size])
+            rows = self.get_rows(queryset, recipes, request.user)
+            for serializer_class in (RecipeSerializer, RecipeListSerializer):
+                expected = self.get_expected(
+                    serializer_class, recipes, request
+                )
+                for label, data in (('объекты', recipes), ('values', rows)):
+                    actual = serializer_class(
+                        data, many=True, context={'request': request}
+                    ).data
+                    if len(actual) != len(expected):
+                        raise CommandError(
+                            f'{serializer_class.__name__} {label}: '
+                            f'{len(actual)} рецептов вместо {len(expected)}'
+                        )
+                    for before, after in zip(expected, actual):
+                        checked += 1
+                        if before != after:
+                            mismatched += 1
+                            self.stderr.write(
+                                f'{serializer_class.__name__} {label} '
+                                f'рецепт {before["id"]}:\n'
+                                f'  DRF:    {before}\n  быстро: {after}'
+                            )
+        if mismatched:
+            raise CommandError(f'Расхождений: {mismatched} из {checked}')
+        self.stdout.write(self.style.SUCCESS(f'Совпадает: {checked}'))
+
+    def get_request(self, user_id):
+        request = Request(
+            RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0]).get('/')
+        )
+        if user_id is not None:
+            request.user = User.objects.get(pk=user_id)
+        return request
+
+    def get_expected(self, serializer_class, recipes, request):
+        """ Вывод обычным ModelSerializer.to_representation """
+        serializer = serializer_class(context={'request': request})
+        return [
+            serializers.ModelSerializer.to_representation(serializer, recipe)
+            for recipe in recipes
+        ]
+
+    def get_rows(self, queryset, recipes, user):
+        """ Те же рецепты словарями из .values() """
+        ids = [recipe.id for recipe in recipes]
+        tags = defaultdict(list)
+        for link in Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).values('recipe_id', 'tag__id', 'tag__name', 'tag__color',
+                 'tag__slug').order_by('id'):
+            tags[link.pop('recipe_id')].append(
+                {key[5:]: value for key, value in link.items()}
+            )
+        ingredients = defaultdict(list)
+        for item in IngredientInRecipe.objects.filter(
+            recipe_id__in=ids
+        ).values('recipe_id', 'ingredient__id', 'ingredient__name',
+                 'ingredient__measurement_unit', 'amount').order_by('id'):
+            ingredients[item['recipe_id']].append(item)
+        subscribed = set(user.subscriber.values_list(
+            'author_id', flat=True
+        )) if user.is_authenticated else set()
+        authors = {
+            author['id']: dict(
+                author, is_subscribed=author['id'] in subscribed
+            )
+            for author in User.objects.filter(
+                recipes__in=ids
+            ).values('id', 'email', 'username', 'first_name', 'last_name')
+        }
+        rows = queryset.filter(id__in=ids).values(
+            'id', 'author_id', 'name', 'image', 'text', 'cooking_time',
+            'is_favorited', 'is_in_shopping_cart',
+        )
+        return [
+            dict(
+                row,
+                author=authors[row['author_id']],
+                tags=tags[row['id']],
+                ingredientinrecipe_set=ingredients[row['id']],
+            ) for row in rows
+        ]
@@ -0,0 +1,192 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.counters import repair_counters
+from api.feed import rebuild_feeds
+from api.ranking import reset_scores
+from api.search import update_search_documents
+from api.shopping_cart import repair_carts
+from api.signals import ingredients_changed
+from recipes.models import (FavoritesList, Follow, IngredientInRecipe,
+                            Ingredients, Recipe, ShoppingList, Tag)
+from users.models import User
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Генерация тестовых пользователей, рецептов и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных рецептов')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--image', default='recipes/images/sample.png')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredients = list(
+            Ingredients.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredients:
+            raise CommandError(
+                'Сначала загрузите ингредиенты: manage.py importcsv'
+            )
+        tags = self.get_tags()
+        with transaction.atomic():
+            users = self.create_users(options['users'], options['seed'])
+            recipes = self.create_recipes(
+                options['recipes'], users, options['image']
+            )
+            self.create_ingredients(recipes, ingredients)
+            self.create_tags(recipes, tags)
+            update_search_documents(recipes)
+            ingredients_changed.send(
+                sender=Recipe, recipe_ids=recipes, bulk=True
+            )
+            self.create_relations(
+                Follow, 'author', users, users, options['follows']
+            )
+            self.create_relations(
+                FavoritesList, 'recipe', users, recipes, options['favorites']
+            )
+            self.create_relations(
+                ShoppingList, 'recipe', users, recipes, options['cart']
+            )
+            repair_counters()
+            repair_carts()
+            rebuild_feeds()
+            reset_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)}'
+        ))
+
+    def skewed_sample(self, population, count):
+        """ Выборка без повторов, в которой первые элементы популярнее """
+        count = min(count, len(population))
+        if count * 2 >= len(population):
+            return self.random.sample(population, count)
+        chosen = set()
+        while len(chosen) < count:
+            index = int(len(population) * self.random.paretovariate(1.2))
+            chosen.add(population[(index - len(population)) % len(population)])
+        return list(chosen)
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def bulk_create(self, model, objects):
+        """ Создать объекты и вернуть их id в порядке создания """
+        start = model.objects.aggregate(start=Max('id'))['start'] or 0
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return list(
+            model.objects.filter(id__gt=start)
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def create_users(self, count, seed):
+        password = make_password('foodgram-password')
+        start = User.objects.aggregate(start=Max('id'))['start'] or 0
+        return self.bulk_create(User, [
+            User(
+                username=f'user_{seed}_{start + number}',
+                email=f'user_{seed}_{start + number}@example.com',
+                first_name=f'Имя {number}',
+                last_name=f'Фамилия {number}',
+                password=password,
+            ) for number in range(count)
+        ])
+
+    def create_recipes(self, count, users, image):
+        now = timezone.now()
+        authors = self.random.choices(
+            users,
+            weights=[1 / (rank + 1) for rank in range(len(users))],
+            k=count
+        )
+        ids = self.bulk_create(Recipe, [
+            Recipe(
+                author_id=author,
+                name=f'Рецепт {number}',
+                text=' '.join(
+                    f'Шаг {step}.' for step in range(
+                        self.random.randint(5, 50)
+                    )
+                ),
+                cooking_time=self.random.randint(5, 180),
+                image=image,
+            ) for number, author in enumerate(authors)
+        ])
+        recipes = [
+            Recipe(
+                id=recipe_id,
+                pub_date=now - timedelta(
+                    minutes=self.random.randint(0, 60 * 24 * 365)
+                )
+            ) for recipe_id in ids
+        ]
+        Recipe.objects.bulk_update(
+            recipes, ('pub_date',), batch_size=self.batch_size
+        )
+        return ids
+
+    def create_ingredients(self, recipes, ingredients):
+        IngredientInRecipe.objects.bulk_create((
+            IngredientInRecipe(
+                recipe_id=recipe,
+                ingredient_id=ingredient,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient in self.skewed_sample(
+                ingredients,
+                max(1, round(self.random.gauss(8, 3)))
+            )
+        ), batch_size=self.batch_size)
+
+    def create_tags(self, recipes, tags):
+        through = Recipe.tags.through
+        through.objects.bulk_create((
+            through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in self.random.sample(
+                tags, self.random.randint(1, min(3, len(tags)))
+            )
+        ), batch_size=self.batch_size)
+
+    def create_relations(self, model, field, users, targets, average):
+        objects = []
+        for user in users:
+            count = min(
+                len(targets) - 1, int(self.random.expovariate(1 / average))
+            )
+            for target in self.skewed_sample(targets, count):
+                if field == 'author' and target == user:
+                    continue
+                objects.append(model(user_id=user, **{f'{field}_id': target}))
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=True
+        )
@@ -0,0 +1,58 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from api.cache import catalog_cache
+from core.importers import LOADERS, READERS
+
+
+class Command(BaseCommand):
+    help = ('Загрузка ингредиентов, тегов и рецептов из CSV, JSON '
+            'или NDJSON; повторная загрузка не создаёт дублей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            default='data/ingredients.csv')
+        parser.add_argument('--model', choices=LOADERS,
+                            default='ingredients')
+        parser.add_argument('--format', choices=READERS,
+                            help='По умолчанию по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path, model = options['path'], options['model']
+        file_format = options['format'] or (
+            os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if file_format == 'csv' and model == 'recipes':
+            raise CommandError('Рецепты загружаются из JSON или NDJSON')
+        started = time.monotonic()
+        total = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = READERS[file_format](file, model)
+            while True:
+                try:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    with transaction.atomic():
+                        LOADERS[model](batch)
+                except (KeyError, TypeError, ValueError,
+                        IntegrityError) as error:
+                    raise CommandError(
+                        f'Ошибка после строки {total}: {error!r}'
+                    )
+                total += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Обработано {total} строк, {total / elapsed:.0f} строк/с'
+                )
+        catalog_cache.bump()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {total} за {time.monotonic() - started:.1f} с'
+        ))
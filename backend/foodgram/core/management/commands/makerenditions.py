@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from api.images import has_renditions, make_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Переименование картинок рецептов по хэшу содержимого '
+            'и создание уменьшенных копий')
+
+    def handle(self, *args, **options):
+        renamed = 0
+        for recipe in Recipe.objects.only('id', 'image').iterator():
+            name = recipe.image.name
+            if not has_renditions(name):
+                if not default_storage.exists(name):
+                    self.stderr.write(f'Рецепт {recipe.id}: нет файла {name}')
+                    continue
+                with default_storage.open(name) as image:
+                    content = image.read()
+                directory, extension = (
+                    os.path.dirname(name), os.path.splitext(name)[1]
+                )
+                name = '{}/{}{}'.format(
+                    directory, hashlib.sha256(content).hexdigest(), extension
+                )
+                if not default_storage.exists(name):
+                    default_storage.save(name, ContentFile(content))
+                Recipe.objects.filter(id=recipe.id).update(
+                    image=name, modified=timezone.now()
+                )
+                renamed += 1
+            make_renditions(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, переименовано картинок: {renamed}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from api.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнение лент подписок последними рецептами авторов после '
+        'загрузки подписок в обход сигналов'
+    )
+
+    def handle(self, *args, **options):
+        authors = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены по рецептам {authors} авторов'
+        ))
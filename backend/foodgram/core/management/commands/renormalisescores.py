@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from api.ranking import renormalise_scores, reset_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос начала отсчёта популярности рецептов на текущий момент; '
+        'запускать по расписанию, например раз в час'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Пересчитать очки заново по счётчикам')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            count = reset_scores()
+            message = f'Очки пересчитаны по счётчикам у {count} рецептов'
+        else:
+            count = renormalise_scores()
+            message = f'Очки перенормированы у {count} рецептов'
+        self.stdout.write(self.style.SUCCESS(message))
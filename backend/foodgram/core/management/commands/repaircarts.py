@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from api.shopping_cart import repair_carts
+
+
+class Command(BaseCommand):
+    help = 'Пересборка сводных списков покупок по рецептам в корзинах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        drift = repair_carts(dry_run=options['dry_run'])
+        self.stdout.write(f'Неверных строк в списках покупок: {drift}')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Списки покупок исправлены'))
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from api.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного, корзин, рецептов и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        drift = repair_counters(dry_run=options['dry_run'])
+        for counter, count in drift.items():
+            self.stdout.write(f'{counter}: расхождений {count}')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Счётчики исправлены'))
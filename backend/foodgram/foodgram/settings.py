@@ -1,6 +1,9 @@
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +49,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Заголовки X-DB-Queries/X-DB-Time и журнал медленных запросов
+DB_QUERY_STATS = os.getenv('DB_QUERY_STATS', 'False') == 'True'
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', 50))
+if DB_QUERY_STATS:
+    MIDDLEWARE.insert(0, 'api.middleware.QueryCountMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -77,9 +87,70 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+    }
+}
+
+# Реплики для чтения: адреса через запятую (для SQLite — файлы баз).
+# После записи клиент REPLICA_PIN_SECONDS читает с основной базы;
+# реплика, отставшая больше REPLICA_MAX_LAG секунд, пропускается.
+REPLICA_DATABASES = []
+for number, replica in enumerate(filter(None, map(
+    str.strip, os.getenv('DB_REPLICAS', '').split(',')
+)), start=1):
+    location = (
+        'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+        else 'HOST'
+    )
+    DATABASES[f'replica_{number}'] = dict(
+        DATABASES['default'], TEST={'MIRROR': 'default'}, **{location: replica}
+    )
+    REPLICA_DATABASES.append(f'replica_{number}')
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+REPLICA_CHECK_INTERVAL = int(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+REPLICA_MAX_LAG = int(os.getenv('REPLICA_MAX_LAG', 2))
+if REPLICA_DATABASES:
+    DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+    MIDDLEWARE.append('api.middleware.ReplicaMiddleware')
+
+# Асинхронное чтение рецептов, тегов, ингредиентов и подписок под ASGI
+# (например, gunicorn -k uvicorn.workers.UvicornWorker foodgram.asgi).
+# Запросы к базе идут в пуле потоков, одновременно не больше
+# ASYNC_DB_CONCURRENCY на процесс; соединения стоит держать открытыми
+# через DB_CONN_MAX_AGE.
+ASYNC_READS = os.getenv('ASYNC_READS', 'False') == 'True'
+ASYNC_DB_CONCURRENCY = int(os.getenv('ASYNC_DB_CONCURRENCY', 10))
+
+# Общий кэш процессов. Через него идут версии для ETag и
+# Last-Modified, копии справочников, отзыв токенов, журнал изменений
+# поиска по продуктам, привязка к основной базе после записи и
+# выгрузка списка покупок. Кэш в памяти процесса (LocMemCache) другие
+# процессы gunicorn не видят: запись в одном не доходит до остальных,
+# и они отдают устаревшие 304 и справочники. Поэтому по умолчанию
+# memcached, а кэш процесса допускается только с отладкой или явным
+# CACHE_SINGLE_PROCESS=True (один процесс, например тесты).
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.memcached.PyMemcacheCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
     }
 }
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES
+CACHE_SINGLE_PROCESS = os.getenv('CACHE_SINGLE_PROCESS', 'False') == 'True'
+if not (CACHE_IS_SHARED or DEBUG or CACHE_SINGLE_PROCESS):
+    raise ImproperlyConfigured(
+        f'{CACHES["default"]["BACKEND"]} не общий для процессов: укажите '
+        'CACHE_BACKEND и CACHE_LOCATION общего кэша (memcached) или '
+        'CACHE_SINGLE_PROCESS=True для одного процесса'
+    )
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -150,10 +221,112 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
+# MessagePack только по Accept/Content-Type: application/msgpack
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'api.renderers.MessagePackRenderer'
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+        'api.renderers.MessagePackParser'
+    )
+
 AUTH_USER_MODEL = 'users.User'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
+# Кэш проверенных токенов: время жизни записи и размер LRU процесса.
+# Работает только с общим кэшем (CACHE_IS_SHARED), иначе токены
+# проверяются в базе на каждом запросе
+AUTH_TOKEN_CACHE_TTL = 300
+AUTH_TOKEN_CACHE_SIZE = 10000
+
 RECIPES_LIMIT = 3
+INGREDIENT_SEARCH_LIMIT = 50
+# Лента подписок: авторам с большим числом подписчиков рецепты не
+# раскладываются по лентам, а читаются при запросе ленты
+FEED_FANOUT_LIMIT = 10000
+FEED_FANOUT_BATCH = 1000
+FEED_BACKFILL = 20
+# Больше стольких рецептов в избранное и корзину за запрос не принимаем
+RECIPE_MARKS_BATCH_LIMIT = 500
+# Больше стольких подписок/избранного в памяти запроса не загружаем
+VIEWER_SET_LIMIT = 5000
+
+# Поиск по продуктам: сколько ингредиентов может не хватать, сколько
+# изменений составов процесс догружает из журнала вместо пересборки
+# индекса, сколько хранится запись журнала и по сколько id найденное
+# проверяется фильтрами
+PANTRY_MAX_MISSING = 3
+PANTRY_MAX_INGREDIENTS = 100
+PANTRY_MAX_CHANGES = 1000
+PANTRY_CHANGE_TIMEOUT = 60 * 60
+PANTRY_FILTER_BATCH_SIZE = 500
+
+# Похожие рецепты: сколько хранить на рецепт, размер пачки пересчёта,
+# доля рецептов, выше которой ингредиент не учитывается, и число
+# кандидатов при обновлении одного рецепта. Обновление рецепта не
+# пересчитывает сходство остальных пар при сдвиге частот ингредиентов:
+# manage.py buildsimilar нужно запускать по расписанию (например, раз
+# в сутки)
+SIMILAR_RECIPES_TOP_K = 10
+SIMILAR_BATCH_SIZE = 200
+SIMILAR_MAX_DF = 0.5
+SIMILAR_CANDIDATES = 5000
+
+# Популярность рецептов: вес отметки и время в секундах, за которое её
+# вклад уменьшается вдвое, для ?ordering=popular и ?ordering=trending
+RANKING_FAVORITE_WEIGHT = 1.0
+RANKING_CART_WEIGHT = 2.0
+RANKING_HALF_LIVES = {
+    'popularity': 30 * 24 * 60 * 60,
+    'trending': 24 * 60 * 60,
+}
+
+# Картинки рецептов: ограничения загрузки и уменьшенные копии
+# (ширина, высота) для списков и карточек
+RECIPE_IMAGE_MAX_SIZE = 10 * 2 ** 20
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+RECIPE_IMAGE_FORMAT = 'WEBP'
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_RENDITIONS = {
+    'thumb': (320, 320),
+    'medium': (960, 960),
+}
+
+# Выгрузка списка покупок: время жизни готового файла и шрифт для PDF
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Каталог с сохранёнными результатами manage.py benchmarkapi
+BENCHMARK_DIR = BASE_DIR / 'benchmarks'
@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import (FavoritesList, Ingredients, Follow,
                      Recipe, ShoppingList, Tag)
+from .signals import recipe_changing, recipe_saved
 
 
 class IngredientsRecipeLine(admin.TabularInline):
@@ -27,20 +28,27 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     """ Управление рецептами """
-    list_display = ('name', 'author', 'favorites')
+    list_display = ('name', 'author', 'favorites', 'in_carts_count')
     search_fields = ('author', 'name')
     list_filter = ('tags', )
     filter_horizontal = ('tags', )
+    readonly_fields = ('favorites_count', 'in_carts_count')
     empty_value_display = '-пусто-'
     inlines = (IngredientsRecipeLine,)
 
     def favorites(self, obj):
-        if FavoritesList.objects.filter(recipe=obj).exists():
-            return FavoritesList.objects.filter(recipe=obj).count()
-        return 0
+        return obj.favorites_count
 
     favorites.short_description = 'Количество добавлений рецепта в избранное'
 
+    def save_related(self, request, form, formsets, change):
+        if change:
+            recipe_changing.send(sender=Recipe, recipe=form.instance)
+        super().save_related(request, form, formsets, change)
+        recipe_saved.send(
+            sender=Recipe, recipe=form.instance, created=not change
+        )
+
 
 @admin.register(FavoritesList)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 01:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0003_auto_20230704_2018'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='favoriteslist',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favoriteslist', to='recipes.recipe', verbose_name='Съедобные кушанья'),
+        ),
+        migrations.AlterField(
+            model_name='favoriteslist',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favoriteslist', to=settings.AUTH_USER_MODEL, verbose_name='Подсчипчик'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+    ]
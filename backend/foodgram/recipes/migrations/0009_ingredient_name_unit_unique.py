@@ -0,0 +1,54 @@
+# Generated by Django 3.2 on 2026-10-18 02:08
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_rows(model, owner, keep, duplicates):
+    """ Перенести строки на оставшийся ингредиент, складывая количество """
+    for row in model.objects.filter(ingredient_id__in=duplicates):
+        kept = model.objects.filter(
+            ingredient_id=keep, **{owner: getattr(row, owner)}
+        ).first()
+        if kept is None:
+            row.ingredient_id = keep
+            row.save(update_fields=['ingredient'])
+        else:
+            kept.amount += row.amount
+            kept.save(update_fields=['amount'])
+            row.delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredients = apps.get_model('recipes', 'Ingredients')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    groups = Ingredients.objects.values('name', 'measurement_unit').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for group in groups:
+        duplicates = list(Ingredients.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep']).values_list('id', flat=True))
+        merge_rows(IngredientInRecipe, 'recipe_id', group['keep'], duplicates)
+        merge_rows(
+            ShoppingCartIngredient, 'user_id', group['keep'], duplicates
+        )
+        Ingredients.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredients',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='ingredient_name_unit_unique'),
+        ),
+    ]
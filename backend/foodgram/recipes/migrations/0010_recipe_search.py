@@ -0,0 +1,80 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'recipes_recipesearch'
+CREATE_SQL = {
+    'postgresql': [
+        f'''CREATE TABLE {SEARCH_TABLE} (
+            recipe_id integer PRIMARY KEY
+                REFERENCES recipes_recipe (id) ON DELETE CASCADE
+                DEFERRABLE INITIALLY DEFERRED,
+            document tsvector NOT NULL
+        )''',
+        f'''CREATE INDEX recipe_search_document_idx
+            ON {SEARCH_TABLE} USING gin (document)''',
+    ],
+    'sqlite': [
+        f'''CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+            name, ingredients, text,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )''',
+    ],
+}
+FILL_SQL = {
+    'postgresql': f'''
+        INSERT INTO {SEARCH_TABLE} (recipe_id, document)
+        SELECT recipe.id,
+            setweight(to_tsvector('russian', {{name}}), 'A')
+            || setweight(to_tsvector('russian', coalesce(
+                string_agg({{ingredient}}, ' '), '')), 'B')
+            || setweight(to_tsvector('russian', {{text}}), 'C')
+        {{source}}
+    ''',
+    'sqlite': f'''
+        INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text)
+        SELECT recipe.id, {{name}},
+            coalesce(group_concat({{ingredient}}, ' '), ''), {{text}}
+        {{source}}
+    ''',
+}
+SOURCE_SQL = '''
+    FROM recipes_recipe AS recipe
+    LEFT JOIN recipes_ingredientinrecipe AS item
+        ON item.recipe_id = recipe.id
+    LEFT JOIN recipes_ingredients AS ingredient
+        ON ingredient.id = item.ingredient_id
+    GROUP BY recipe.id
+'''
+
+
+def fold_yo(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    for sql in CREATE_SQL[vendor]:
+        schema_editor.execute(sql)
+    schema_editor.execute(FILL_SQL[vendor].format(
+        name=fold_yo('recipe.name'),
+        ingredient=fold_yo('ingredient.name'),
+        text=fold_yo('recipe.text'),
+        source=SOURCE_SQL,
+    ))
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute(f'DROP TABLE {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_ingredient_name_unit_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2 on 2026-10-18 02:32
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+FAVORITE_WEIGHT = 1.0
+CART_WEIGHT = 2.0
+
+
+def fill_scores(apps, schema_editor):
+    # Все уже поставленные отметки считаются сделанными сейчас
+    apps.get_model('recipes', 'RankingEpoch').objects.create(
+        started=timezone.now()
+    )
+    score = (
+        F('favorites_count') * FAVORITE_WEIGHT
+        + F('in_carts_count') * CART_WEIGHT
+    )
+    apps.get_model('recipes', 'Recipe').objects.update(
+        popularity=score, trending=score
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(verbose_name='Начало отсчёта')),
+            ],
+            options={
+                'verbose_name': 'Начало отсчёта популярности',
+                'verbose_name_plural': 'Начало отсчёта популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, verbose_name='Популярность за последние дни'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'recipes_recipesearch'
+
+
+def widen_recipe_id(apps, schema_editor):
+    # Recipe.id — BigAutoField, а 0010 создала recipe_id как integer
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'ALTER TABLE {SEARCH_TABLE} ALTER COLUMN recipe_id TYPE bigint'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_ranking'),
+    ]
+
+    operations = [
+        migrations.RunPython(widen_recipe_id, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2 on 2026-10-18 02:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_scored(apps, schema_editor):
+    # Очки уже поставленных отметок считались от начала отсчёта
+    started = apps.get_model('recipes', 'RankingEpoch').objects.values_list(
+        'started', flat=True
+    ).first()
+    if started is None:
+        return
+    for name in ('FavoritesList', 'ShoppingList'):
+        apps.get_model('recipes', name).objects.update(scored=started)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_search_bigint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoriteslist',
+            name='scored',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Учтено в популярности'),
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='scored',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Учтено в популярности'),
+        ),
+        migrations.RunPython(fill_scored, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db.models import UniqueConstraint
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -20,6 +21,12 @@ class Ingredients(models.Model):
 
     class Meta:
         ordering = ('name',)
+        constraints = [
+            UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='ingredient_name_unit_unique'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -88,9 +95,44 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    modified = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в список покупок',
+        default=0
+    )
+    popularity = models.FloatField(
+        verbose_name='Популярность',
+        default=0
+    )
+    trending = models.FloatField(
+        verbose_name='Популярность за последние дни',
+        default=0
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-popularity', '-id'), name='recipe_popularity_idx'
+            ),
+            models.Index(
+                fields=('-trending', '-id'), name='recipe_trending_idx'
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -140,6 +182,13 @@ class FavoritesList(models.Model):
         related_name='favoriteslist',
         verbose_name='Съедобные кушанья',
     )
+    # Когда отметка учтена в популярности рецепта: при снятии
+    # вычитается её вклад на этот момент
+    scored = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Учтено в популярности',
+    )
 
     class Meta:
         constraints = [
@@ -166,6 +215,13 @@ class ShoppingList(models.Model):
         related_name='shopping_list',
         verbose_name='Рецепт',
     )
+    # Когда отметка учтена в популярности рецепта: при снятии
+    # вычитается её вклад на этот момент
+    scored = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Учтено в популярности',
+    )
 
     class Meta:
         constraints = [
@@ -206,3 +262,111 @@ class IngredientInRecipe(models.Model):
         ]
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
+
+
+class ShoppingCartIngredient(models.Model):
+    '''8.	Сводный список покупок по ингредиентам'''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='user_cart_ingredient_unique'
+            )
+        ]
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+
+
+class FeedEntry(models.Model):
+    '''9.	Лента рецептов подписчика'''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='user_feed_recipe_unique'
+            )
+        ]
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx'
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+
+class SimilarRecipe(models.Model):
+    '''10.	Похожий рецепт по общим ингредиентам'''
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='recipe_similar_unique'
+            )
+        ]
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx'
+            ),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+
+class RankingEpoch(models.Model):
+    '''11.	Начало отсчёта популярности рецептов'''
+    started = models.DateTimeField(verbose_name='Начало отсчёта')
+
+    class Meta:
+        verbose_name = 'Начало отсчёта популярности'
+        verbose_name_plural = 'Начало отсчёта популярности'
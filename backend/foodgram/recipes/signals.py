@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Админка: состав рецепта recipe сейчас будет заменён
+recipe_changing = Signal()
+# Админка: рецепт recipe сохранён вместе с составом и тегами;
+# created — новый рецепт
+recipe_saved = Signal()
@@ -0,0 +1,137 @@
+from collections import namedtuple
+
+import pytest
+from django.core.cache import cache
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from recipes.models import (FavoritesList, Follow, IngredientInRecipe,
+                            Ingredients, Recipe, ShoppingList, Tag)
+from users.models import User
+
+QueryBudget = namedtuple('QueryBudget', ('base', 'per_item'))
+
+# Бюджет запросов к базе для эндпоинтов api без учёта аутентификации:
+# base - постоянная часть, per_item - добавка на каждый объект страницы.
+QUERY_BUDGETS = {
+    'recipes-list': QueryBudget(base=6, per_item=0),
+    'recipes-detail': QueryBudget(base=5, per_item=0),
+    'recipes-download-shopping-cart': QueryBudget(base=2, per_item=0),
+    'users-subscriptions': QueryBudget(base=3, per_item=0),
+    'ingredients-list': QueryBudget(base=1, per_item=0),
+    'tags-list': QueryBudget(base=1, per_item=0),
+}
+RECIPES = 8
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """ Версии и справочники в общем кэше не переходят между тестами """
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def assert_query_budget():
+    def check(client, name, items=0, args=None, data=None, using='default'):
+        """ Выполнить GET к эндпоинту и проверить число запросов к базе """
+        budget = QUERY_BUDGETS[name]
+        limit = budget.base + budget.per_item * items
+        url = reverse(f'api:{name}', args=args)
+        with CaptureQueriesContext(connections[using]) as context:
+            response = client.get(url, data)
+        assert response.status_code == 200, response.content
+        queries = '\n'.join(
+            query['sql'] for query in context.captured_queries
+        )
+        assert len(context) <= limit, (
+            f'{url}: {len(context)} запросов к базе при бюджете {limit}\n'
+            f'{queries}'
+        )
+        return response
+    return check
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password',
+        first_name=username.title(),
+        last_name='Test',
+    )
+
+
+@pytest.fixture
+def author(db):
+    return create_user('author')
+
+
+@pytest.fixture
+def viewer(db):
+    return create_user('viewer')
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                           slug=f'tag-{number}')
+        for number in range(2)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredients.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(4)
+    ]
+
+
+@pytest.fixture
+def recipes(author, tags, ingredients):
+    recipes = []
+    for number in range(RECIPES):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=number + 1,
+        )
+        recipe.tags.set(tags[:number % 2 + 1])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient=ingredient, amount=number + 10
+            ) for ingredient in ingredients[:number % 3 + 2]
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+@pytest.fixture
+def marks(viewer, author, recipes):
+    """ Viewer подписан на автора, половина рецептов в избранном и
+    в списке покупок """
+    Follow.objects.create(user=viewer, author=author)
+    for recipe in recipes[::2]:
+        FavoritesList.objects.create(user=viewer, recipe=recipe)
+        ShoppingList.objects.create(user=viewer, recipe=recipe)
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def viewer_client(viewer):
+    client = APIClient()
+    client.force_authenticate(viewer)
+    return client
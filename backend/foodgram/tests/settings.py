@@ -0,0 +1,9 @@
+""" Настройки тестов: один процесс, кэш в его памяти """
+import os
+
+os.environ.setdefault(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+os.environ.setdefault('CACHE_SINGLE_PROCESS', 'True')
+
+from foodgram.settings import *  # noqa: E402,F401,F403
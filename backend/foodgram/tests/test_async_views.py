@@ -0,0 +1,66 @@
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import pytest
+from django.test import AsyncRequestFactory
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import async_views
+
+# Потоки пула открывают свои соединения: данные должны быть в базе
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.usefixtures('marks'),
+]
+
+
+@pytest.fixture(params=('anonymous', 'viewer'))
+def authorization(request):
+    if request.param == 'anonymous':
+        return None
+    viewer = request.getfixturevalue('viewer')
+    return f'Token {Token.objects.create(user=viewer).key}'
+
+
+def compare(view, url, authorization, data=None, **kwargs):
+    """ Ответы синхронного вьюсета и асинхронного вью совпадают """
+    client = APIClient()
+    headers = {}
+    if authorization:
+        client.credentials(HTTP_AUTHORIZATION=authorization)
+        headers['authorization'] = authorization
+    expected = client.get(url, data)
+    # Django 3.2 теряет data у AsyncRequestFactory.get, а заголовки
+    # ждёт в виде ASGI
+    request = AsyncRequestFactory().get(
+        f'{url}?{urlencode(data or {})}', **headers
+    )
+    actual = asyncio.run(view(request, **kwargs))
+    assert actual.status_code == expected.status_code == 200
+    assert json.loads(actual.content) == json.loads(expected.content)
+    assert actual['ETag'] == expected['ETag']
+
+
+def test_recipe_list(authorization, recipes):
+    compare(
+        async_views.recipe_list, reverse('api:recipes-list'), authorization,
+        {'limit': len(recipes)}
+    )
+
+
+def test_filtered_recipe_list(authorization, tags):
+    compare(
+        async_views.recipe_list, reverse('api:recipes-list'), authorization,
+        {'tags': tags[1].slug, 'is_favorited': 1}
+    )
+
+
+def test_recipe_detail(authorization, recipes):
+    compare(
+        async_views.recipe_detail,
+        reverse('api:recipes-detail', args=(recipes[0].id,)), authorization,
+        pk=recipes[0].id
+    )
@@ -0,0 +1,40 @@
+import pytest
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+
+
+@pytest.fixture
+def token_client(viewer):
+    token = Token.objects.create(user=viewer)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('shared', (False, True))
+def test_logout_revokes_token(settings, token_client, shared):
+    settings.CACHE_IS_SHARED = shared
+    assert token_client.get('/api/users/me/').status_code == 200
+    assert token_client.post('/api/auth/token/logout/').status_code == 204
+    assert token_client.get('/api/users/me/').status_code == 401
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('shared', (False, True))
+def test_deactivated_user_rejected(settings, viewer, token_client, shared):
+    settings.CACHE_IS_SHARED = shared
+    assert token_client.get('/api/users/me/').status_code == 200
+    viewer.is_active = False
+    viewer.save()
+    assert token_client.get('/api/users/me/').status_code == 401
+
+
+def test_per_process_cache_skips_token_cache(settings, token_client):
+    settings.CACHE_IS_SHARED = False
+    misses = token_cache.stats['misses']
+    for _ in range(2):
+        assert token_client.get('/api/users/me/').status_code == 200
+    assert token_cache.stats['misses'] == misses
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+from django.urls import reverse
+from rest_framework import serializers
+
+from api.serializers import RecipeListSerializer, RecipeSerializer
+from api.views import RecipeViewSet
+
+pytestmark = pytest.mark.usefixtures('marks')
+
+
+def get_expected(response, serializer_class, ids):
+    """ Те же рецепты обычным ModelSerializer.to_representation """
+    request = response.renderer_context['request']
+    view = RecipeViewSet(request=request, format_kwarg=None)
+    recipes = view.get_queryset().filter(id__in=ids).order_by('-id')
+    serializer = serializer_class(context={'request': request})
+    return [
+        serializers.ModelSerializer.to_representation(serializer, recipe)
+        for recipe in recipes
+    ]
+
+
+@pytest.mark.parametrize('client_name', ('anonymous_client', 'viewer_client'))
+def test_recipe_list(request, client_name, recipes):
+    client = request.getfixturevalue(client_name)
+    response = client.get(
+        reverse('api:recipes-list'), {'limit': len(recipes)}
+    )
+    assert response.status_code == 200, response.content
+    actual = json.loads(response.content)['results']
+    expected = get_expected(
+        response, RecipeListSerializer, [recipe.id for recipe in recipes]
+    )
+    assert sorted(actual, key=lambda recipe: -recipe['id']) == expected
+
+
+@pytest.mark.parametrize('client_name', ('anonymous_client', 'viewer_client'))
+def test_recipe_detail(request, client_name, recipes):
+    client = request.getfixturevalue(client_name)
+    for recipe in recipes[:2]:
+        response = client.get(
+            reverse('api:recipes-detail', args=(recipe.id,))
+        )
+        assert response.status_code == 200, response.content
+        expected = get_expected(response, RecipeSerializer, [recipe.id])
+        assert [json.loads(response.content)] == expected
@@ -0,0 +1,18 @@
+import pytest
+from django.db import transaction
+
+from api.feed import fan_out
+from recipes.models import FeedEntry, Follow
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fan_out_runs_after_commit(settings, author, viewer, recipes):
+    settings.FEED_FANOUT_BATCH = 1
+    Follow.objects.create(user=viewer, author=author)
+    FeedEntry.objects.all().delete()
+    with transaction.atomic():
+        fan_out(recipes[0])
+        assert not FeedEntry.objects.exists()
+    assert list(FeedEntry.objects.values_list('user_id', 'recipe_id')) == [
+        (viewer.id, recipes[0].id)
+    ]
@@ -0,0 +1,30 @@
+import pytest
+from django.urls import reverse
+
+from api.pantry import pantry_index
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    """ Индекс процесса собирается заново по базе теста """
+    pantry_index.sequence = None
+
+
+@pytest.mark.parametrize('page', (1, 2, 'last'))
+def test_filtered_pantry_pages(settings, anonymous_client, recipes, tags,
+                               ingredients, page):
+    settings.PANTRY_FILTER_BATCH_SIZE = 2
+    tagged = [recipe.id for recipe in recipes if recipe.tags.filter(
+        id=tags[1].id
+    ).exists()]
+    response = anonymous_client.get(reverse('api:recipes-pantry'), {
+        'ingredients': ','.join(str(item.id) for item in ingredients),
+        'tags': tags[1].slug,
+        'limit': 2,
+        'page': page,
+    })
+    assert response.status_code == 200, response.content
+    number = len(tagged) // 2 if page == 'last' else page
+    assert [recipe['id'] for recipe in response.data['results']] == sorted(
+        tagged, reverse=True
+    )[(number - 1) * 2:number * 2]
@@ -0,0 +1,52 @@
+import pytest
+
+pytestmark = pytest.mark.usefixtures('marks')
+
+
+@pytest.mark.parametrize('client_name', ('anonymous_client', 'viewer_client'))
+def test_recipe_list(request, client_name, recipes, assert_query_budget):
+    client = request.getfixturevalue(client_name)
+    response = assert_query_budget(
+        client, 'recipes-list', items=len(recipes),
+        data={'limit': len(recipes)}
+    )
+    assert len(response.data['results']) == len(recipes)
+
+
+@pytest.mark.parametrize('client_name', ('anonymous_client', 'viewer_client'))
+def test_recipe_detail(request, client_name, recipes, assert_query_budget):
+    client = request.getfixturevalue(client_name)
+    assert_query_budget(client, 'recipes-detail', args=(recipes[0].id,))
+
+
+def test_subscriptions(viewer_client, recipes, assert_query_budget):
+    response = assert_query_budget(
+        viewer_client, 'users-subscriptions', items=1
+    )
+    assert response.data['results'][0]['recipes_count'] == len(recipes)
+
+
+@pytest.mark.parametrize('mark', ('is_favorited', 'is_in_shopping_cart'))
+def test_marked_recipes(viewer_client, mark, recipes, assert_query_budget):
+    marked = len(recipes[::2])
+    response = assert_query_budget(
+        viewer_client, 'recipes-list', items=marked,
+        data={mark: 1, 'limit': len(recipes)}
+    )
+    assert len(response.data['results']) == marked
+    assert all(recipe[mark] for recipe in response.data['results'])
+
+
+def test_download_shopping_cart(viewer_client, ingredients,
+                                assert_query_budget):
+    response = assert_query_budget(
+        viewer_client, 'recipes-download-shopping-cart'
+    )
+    content = b''.join(response.streaming_content).decode()
+    assert all(ingredient.name in content for ingredient in ingredients)
+
+
+@pytest.mark.parametrize('name', ('ingredients-list', 'tags-list'))
+def test_catalogs(anonymous_client, name, ingredients, tags,
+                  assert_query_budget):
+    assert_query_budget(anonymous_client, name)
@@ -0,0 +1,36 @@
+import pytest
+from django.urls import reverse
+
+from recipes.models import FavoritesList, Recipe
+
+
+def get_scores(recipes):
+    return list(Recipe.objects.filter(
+        id__in=[recipe.id for recipe in recipes]
+    ).order_by('id').values_list('popularity', 'trending'))
+
+
+@pytest.mark.parametrize('name', ('favorite', 'shopping-cart'))
+def test_toggled_mark_scores_once(viewer_client, recipes, name):
+    before = get_scores(recipes)
+    for _ in range(3):
+        assert viewer_client.post(
+            reverse(f'api:recipes-{name}', args=(recipes[0].id,))
+        ).status_code == 201
+        marked = get_scores(recipes)
+        assert viewer_client.delete(
+            reverse(f'api:recipes-{name}', args=(recipes[0].id,))
+        ).status_code == 204
+    assert marked[0][0] > before[0][0]
+    assert get_scores(recipes) == pytest.approx(before)
+
+
+def test_batch_and_signals_remove_score(viewer, viewer_client, recipes):
+    before = get_scores(recipes)
+    url = reverse('api:recipes-favorite-batch')
+    ids = [recipe.id for recipe in recipes[:3]]
+    viewer_client.post(url, {'ids': ids}, format='json')
+    viewer_client.delete(url, {'ids': ids}, format='json')
+    FavoritesList.objects.create(user=viewer, recipe=recipes[0])
+    FavoritesList.objects.filter(user=viewer).delete()
+    assert get_scores(recipes) == pytest.approx(before)
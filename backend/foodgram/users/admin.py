@@ -6,7 +6,9 @@ from .models import User
 @admin.register(User)
 class UsersAdmin(admin.ModelAdmin):
     """Админ панель управление пользователями"""
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
+    readonly_fields = ('recipes_count', 'followers_count')
     search_fields = ('email', 'username')
     list_filter = ('email', 'username')
     ordering = ('username', )